@@ -0,0 +1,88 @@
+"""The request's actor: who is acting and in which role.
+
+Views and permissions read the provider identity of the current user from
+``get_actor(request)`` instead of ``user.provider_profile`` and
+``provider.service_types``, which would each cost a query. The actor is
+built once per user from a single joined query (or from the token claims
+when they are current) and cached with the user by
+``users.authentication.CachedJWTAuthentication``.
+"""
+from dataclasses import dataclass, field
+
+from django.contrib.auth import get_user_model
+
+
+@dataclass(frozen=True)
+class Actor:
+    user_id: int = None
+    is_authenticated: bool = False
+    is_staff: bool = False
+    provider_id: int = None
+    provider_is_active: bool = False
+    service_type_ids: frozenset = field(default_factory=frozenset)
+
+    @property
+    def is_provider(self):
+        return self.provider_id is not None
+
+    def offers(self, service_type_id):
+        return service_type_id in self.service_type_ids
+
+    @classmethod
+    def anonymous(cls):
+        return ANONYMOUS
+
+    @classmethod
+    def for_user(cls, user):
+        """Load the actor of ``user`` with one query (user, provider and its service types joined)."""
+        if user is None or not user.is_authenticated:
+            return ANONYMOUS
+        rows = get_user_model().objects.filter(pk=user.pk).values_list(
+            'is_staff', 'provider_profile__id', 'provider_profile__is_active', 'provider_profile__service_types',
+        )
+        rows = list(rows)
+        if not rows:
+            return ANONYMOUS
+        is_staff, provider_id, provider_is_active, _ = rows[0]
+        return cls(
+            user_id=user.pk,
+            is_authenticated=True,
+            is_staff=is_staff,
+            provider_id=provider_id,
+            provider_is_active=bool(provider_is_active),
+            service_type_ids=frozenset(row[3] for row in rows if row[3] is not None),
+        )
+
+    @classmethod
+    def from_claims(cls, user, token):
+        """The actor described by ``token``'s claims (see ``users.auth.add_actor_claims``), or None if incomplete."""
+        try:
+            return cls(
+                user_id=user.pk,
+                is_authenticated=True,
+                is_staff=user.is_staff,
+                provider_id=token['provider_id'],
+                provider_is_active=token['provider_is_active'],
+                service_type_ids=frozenset(token['service_type_ids']),
+            )
+        except KeyError:
+            return None
+
+
+ANONYMOUS = Actor()
+
+
+def get_actor(request):
+    """The actor for ``request``.
+
+    Taken from the user when the authentication class attached one, else
+    loaded with ``Actor.for_user``; either way only once per request.
+    """
+    try:
+        return request._actor
+    except AttributeError:
+        pass
+    user = getattr(request, 'user', None)
+    actor = getattr(user, 'actor', None) or Actor.for_user(user)
+    request._actor = actor
+    return actor
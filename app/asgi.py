@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_asgi_application()
+
+# build the candidate ranking index before the first request needs it
+from servicerequests import matching  # noqa: E402
+
+matching.warm_up()
@@ -0,0 +1,317 @@
+"""Locations and distance search without spatial extensions.
+
+Users and service requests may carry a ``latitude``/``longitude`` pair,
+filled from their free-text address by the geocoder named in the
+``GEOCODER`` setting (an import path, like the job broker's). The default
+``TableGeocoder`` works offline from a table of place names.
+
+Each located row also stores the geohash of its point, an indexed string
+whose prefixes are nested grid cells: points inside one cell share its
+prefix, so a cell is a contiguous range of the index. ``cover`` turns a
+circle into a few such ranges (``geohash >= low AND geohash < high``),
+which any B-tree answers on SQLite and PostgreSQL alike; the exact
+distance of the rows found is then checked with ``distance_km``.
+"""
+import csv
+import math
+import unicodedata
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as ModelValidationError
+from django.db.models import Q
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import ValidationError
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# length of the stored geohashes, cells of about 5 x 5 m
+GEOHASH_LENGTH = 9
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# cells a circle may be covered with; fewer cells are coarser ones
+MAX_CELLS = 36
+
+
+def encode(latitude, longitude, length=GEOHASH_LENGTH):
+    """Geohash of a point."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < length:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def cell_size(length):
+    """``(height, width)`` in degrees of the cells of geohashes of ``length``."""
+    lon_bits = (5 * length + 1) // 2
+    lat_bits = 5 * length // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def _successor(prefix):
+    """The smallest geohash prefix after every geohash starting with ``prefix`` (None: none)."""
+    while prefix:
+        position = BASE32.index(prefix[-1])
+        if position + 1 < len(BASE32):
+            return prefix[:-1] + BASE32[position + 1]
+        prefix = prefix[:-1]
+    return None
+
+
+def _cells(latitude, longitude, km):
+    """Geohash cells covering the bounding box of the circle, as few as ``MAX_CELLS`` allow."""
+    angle = km / EARTH_RADIUS_KM
+    d_lat = math.degrees(angle)
+    south, north = max(latitude - d_lat, -90.0), min(latitude + d_lat, 90.0)
+    # the widest longitude span of the circle, reached poleward of its centre
+    ratio = math.sin(angle) / math.cos(math.radians(latitude)) if abs(latitude) < 90 else 2
+    if north >= 90 or south <= -90 or angle >= math.pi / 2 or ratio >= 1:
+        # the circle contains a pole or half the globe
+        west, east = -180.0, 180.0
+    else:
+        d_lon = math.degrees(math.asin(ratio))
+        west, east = longitude - d_lon, longitude + d_lon
+
+    best = ['']
+    for length in range(1, GEOHASH_LENGTH + 1):
+        height, width = cell_size(length)
+        rows = range(math.floor((south + 90) / height), math.floor((min(north, 90 - 1e-9) + 90) / height) + 1)
+        columns = range(math.floor((west + 180) / width), math.floor((east + 180) / width) + 1)
+        if len(rows) * len(columns) > MAX_CELLS:
+            break
+        cells = set()
+        for row in rows:
+            for column in columns:
+                # the centre of the cell, wrapped across the antimeridian
+                lon = (column + 0.5) * width % 360 - 180
+                cells.add(encode((row + 0.5) * height - 90, lon, length))
+        best = cells
+    return best
+
+
+def cover(latitude, longitude, km):
+    """``[(low, high), ...]`` geohash ranges containing every point within ``km`` of the point.
+
+    ``high`` is exclusive and None when unbounded. Adjacent cells are merged
+    into one range.
+    """
+    ranges = []
+    for cell in sorted(_cells(latitude, longitude, km)):
+        high = _successor(cell)
+        if ranges and ranges[-1][1] == cell:
+            ranges[-1] = (ranges[-1][0], high)
+        else:
+            ranges.append((cell, high))
+    return ranges
+
+
+def cover_q(field, latitude, longitude, km):
+    """``Q`` matching the rows whose geohash ``field`` is in ``cover(latitude, longitude, km)``."""
+    q = Q()
+    for low, high in cover(latitude, longitude, km):
+        cell = Q(**{f'{field}__gte': low}) if low else Q(**{f'{field}__isnull': False})
+        if high is not None:
+            cell &= Q(**{f'{field}__lt': high})
+        q |= cell
+    return q
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle (haversine) distance between two points."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def within(rows, latitude, longitude, km):
+    """``[(distance, row), ...]`` nearest first, for the ``(pk, lat, lon, ...)`` rows within ``km``."""
+    found = []
+    for row in rows:
+        distance = distance_km(latitude, longitude, row[1], row[2])
+        if distance <= km:
+            found.append((distance, row))
+    found.sort(key=lambda item: (item[0], item[1][0]))
+    return found
+
+
+def set_geohash(instance, kwargs):
+    """Derive ``instance.geohash`` from its coordinates before a ``save(**kwargs)``.
+
+    Returns the save arguments, with ``geohash`` added to ``update_fields``
+    when the coordinates are among them.
+    """
+    if instance.latitude is None or instance.longitude is None:
+        instance.geohash = None
+    else:
+        instance.geohash = encode(instance.latitude, instance.longitude)
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and {'latitude', 'longitude'} & set(update_fields) and 'geohash' not in update_fields:
+        kwargs['update_fields'] = [*update_fields, 'geohash']
+    return kwargs
+
+
+class Geocoder:
+    """Interface of a geocoder backend."""
+
+    def geocode(self, address):
+        """``(latitude, longitude)`` of ``address``, or None when it cannot be located."""
+        raise NotImplementedError
+
+
+# capitals and large cities; GEOCODER_TABLE points to a fuller table
+PLACES = (
+    ('aracaju', -10.9472, -37.0731),
+    ('belem', -1.4558, -48.4902),
+    ('belo horizonte', -19.9167, -43.9345),
+    ('boa vista', 2.8235, -60.6758),
+    ('brasilia', -15.7939, -47.8828),
+    ('campinas', -22.9099, -47.0626),
+    ('campo grande', -20.4697, -54.6201),
+    ('cuiaba', -15.6014, -56.0979),
+    ('curitiba', -25.4284, -49.2733),
+    ('florianopolis', -27.5954, -48.5480),
+    ('fortaleza', -3.7319, -38.5267),
+    ('goiania', -16.6869, -49.2648),
+    ('guarulhos', -23.4538, -46.5333),
+    ('joao pessoa', -7.1195, -34.8450),
+    ('macapa', 0.0349, -51.0694),
+    ('maceio', -9.6658, -35.7353),
+    ('manaus', -3.1190, -60.0217),
+    ('natal', -5.7945, -35.2110),
+    ('niteroi', -22.8832, -43.1034),
+    ('osasco', -23.5325, -46.7917),
+    ('palmas', -10.1840, -48.3336),
+    ('porto alegre', -30.0346, -51.2177),
+    ('porto velho', -8.7612, -63.9004),
+    ('recife', -8.0476, -34.8770),
+    ('rio branco', -9.9747, -67.8100),
+    ('rio de janeiro', -22.9068, -43.1729),
+    ('salvador', -12.9714, -38.5014),
+    ('santos', -23.9608, -46.3336),
+    ('sao luis', -2.5307, -44.3068),
+    ('sao paulo', -23.5505, -46.6333),
+    ('teresina', -5.0920, -42.8038),
+    ('vitoria', -20.3155, -40.3128),
+)
+
+
+def _normalize(text):
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+    return ' '.join(''.join(char if char.isalnum() else ' ' for char in text).split())
+
+
+class TableGeocoder(Geocoder):
+    """Offline geocoder: the longest place name of a table found in the address.
+
+    The table is ``PLACES`` or, with the ``GEOCODER_TABLE`` setting, a CSV
+    file of ``name,latitude,longitude`` rows (neighbourhoods, streets,
+    postal codes, ...). Names are matched as whole words, ignoring case and
+    accents.
+    """
+
+    def __init__(self, places=None):
+        if places is None:
+            path = getattr(settings, 'GEOCODER_TABLE', None)
+            places = self._read(path) if path else PLACES
+        self.places = {_normalize(name): (float(lat), float(lon)) for name, lat, lon in places}
+        self.longest = max((len(name.split()) for name in self.places), default=0)
+
+    @staticmethod
+    def _read(path):
+        with open(path, newline='', encoding='utf-8') as table:
+            return [row[:3] for row in csv.reader(table) if len(row) >= 3 and not row[0].startswith('#')]
+
+    def geocode(self, address):
+        words = _normalize(address or '').split()
+        for size in range(min(self.longest, len(words)), 0, -1):
+            # the last match: addresses end with the city
+            for start in range(len(words) - size, -1, -1):
+                point = self.places.get(' '.join(words[start:start + size]))
+                if point is not None:
+                    return point
+        return None
+
+
+@lru_cache(maxsize=None)
+def get_geocoder():
+    backend = getattr(settings, 'GEOCODER', 'app.geo.TableGeocoder')
+    return import_string(backend)()
+
+
+def locate(validated_data):
+    """Fill ``latitude``/``longitude`` of serializer data from a new ``address``.
+
+    Coordinates given explicitly win; an address that cannot be located
+    clears them rather than keep the old place.
+    """
+    if 'address' in validated_data and 'latitude' not in validated_data and 'longitude' not in validated_data:
+        point = get_geocoder().geocode(validated_data['address']) if validated_data['address'] else None
+        validated_data['latitude'], validated_data['longitude'] = point or (None, None)
+    return validated_data
+
+
+def validate_finite(value):
+    """Field validator rejecting NaN, which passes any range check, and infinities."""
+    if not math.isfinite(value):
+        raise ModelValidationError('Enter a finite number.', code='invalid')
+
+
+def validate_point(attrs):
+    """Serializer check that ``latitude`` and ``longitude`` are given (or cleared) together."""
+    if ('latitude' in attrs) != ('longitude' in attrs) or (attrs.get('latitude') is None) != (attrs.get('longitude') is None):
+        raise ValidationError('Set latitude and longitude together.')
+    return attrs
+
+
+def _coordinate(request, name, limit):
+    try:
+        value = float(request.query_params[name])
+    except ValueError:
+        raise ValidationError({name: 'Use a number.'})
+    if not -limit <= value <= limit:
+        raise ValidationError({name: f'Use a value between -{limit} and {limit}.'})
+    return value
+
+
+def origin(request, user):
+    """``(latitude, longitude)`` from ``?lat=&lon=``, else the location of ``user``.
+
+    Raises a 400 when neither is available.
+    """
+    params = request.query_params
+    if 'lat' in params or 'lon' in params:
+        if 'lat' not in params or 'lon' not in params:
+            raise ValidationError({'detail': 'Set lat and lon together.'})
+        return _coordinate(request, 'lat', 90), _coordinate(request, 'lon', 180)
+    latitude = getattr(user, 'latitude', None)
+    longitude = getattr(user, 'longitude', None)
+    if latitude is None or longitude is None:
+        raise ValidationError({'detail': 'Set lat and lon, or an address that can be located on your profile.'})
+    return latitude, longitude
+
+
+def radius(request, default, cutoff):
+    """``?km=`` as a positive number of kilometres, at most ``cutoff``."""
+    try:
+        km = float(request.query_params.get('km', default))
+    except ValueError:
+        km = 0
+    if not 0 < km <= cutoff:
+        raise ValidationError({'km': f'Use a distance between 0 and {cutoff} km.'})
+    return km
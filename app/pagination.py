@@ -0,0 +1,201 @@
+import base64
+import binascii
+import datetime
+import json
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def keyset_filter(ordering, position, reverse=False):
+    """Q matching rows strictly after ``position`` in ``ordering``.
+
+    ``ordering`` is a sequence of ``order_by`` names (``'-stars'``, ``'id'``)
+    and ``position`` the matching values of the last row seen. With
+    ``reverse`` the rows strictly before ``position`` are matched instead.
+    The comparison is lexicographic, which lets the database walk an index
+    on the same columns instead of skipping rows with OFFSET.
+    """
+    condition = Q()
+    equal = {}
+    for name, value in zip(ordering, position):
+        descending = name.startswith('-')
+        field = name.lstrip('-')
+        lookup = 'lt' if descending != reverse else 'gt'
+        condition |= Q(**equal, **{f'{field}__{lookup}': value})
+        equal[field] = value
+    return condition
+
+
+def _cursor_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination keyed on every column of ``ordering``.
+
+    Unlike DRF's ``CursorPagination``, which only keys on the first ordering
+    field and falls back to OFFSET for ties, the cursor here carries the full
+    position, so a page is always one index range scan with no OFFSET and no
+    COUNT(*), however deep the client pages. Cursors are opaque (base64
+    encoded JSON).
+    """
+
+    ordering = ('-id',)
+    page_size = None
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        if self.page_size is None:
+            from rest_framework.settings import api_settings
+            self.page_size = api_settings.PAGE_SIZE or 20
+
+    def get_ordering(self, request, view=None):
+        return self.ordering
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size,
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def decode_cursor(self, request, queryset):
+        """Return ``(position, reverse)`` for the requested page of ``queryset``.
+
+        The position values are converted by the ordering fields, so a
+        tampered cursor is rejected here instead of failing in the query.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            position, reverse = data['p'], bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        ordering = self.get_ordering(request)
+        if not isinstance(position, list) or len(position) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            position = [
+                self._cursor_field(queryset, name.lstrip('-')).to_python(value)
+                for name, value in zip(ordering, position)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    @staticmethod
+    def _cursor_field(queryset, name):
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(name)
+
+    def encode_cursor(self, position, reverse=False):
+        data = {'p': position}
+        if reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_position(self, row, ordering):
+        fields = [name.lstrip('-') for name in ordering]
+        if isinstance(row, dict):
+            return [_cursor_value(row[field]) for field in fields]
+        return [_cursor_value(getattr(row, field)) for field in fields]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = ordering = tuple(self.get_ordering(request, view))
+        position, reverse = self.decode_cursor(request, queryset)
+
+        if reverse:
+            queryset = queryset.order_by(*[name[1:] if name.startswith('-') else f'-{name}' for name in ordering])
+        else:
+            queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(ordering, position, reverse))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        page = rows[:self.page_size]
+        if reverse:
+            page.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.next_position = self.get_position(page[-1], ordering) if page else position
+        self.previous_position = self.get_position(page[0], ordering) if page else position
+        self.page = page
+        return page
+
+    def get_next_link(self):
+        if not self.has_next or self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_previous_link(self):
+        if not self.has_previous or self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        parameters = [{
+            'name': self.cursor_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'The pagination cursor value.',
+            'schema': {'type': 'string'},
+        }]
+        if self.page_size_query_param:
+            parameters.append({
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            })
+        return parameters
@@ -0,0 +1,134 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+
+
+def str_dependencies(model, prefix=''):
+    """Relations touched by ``model.__str__``, as select_related paths.
+
+    Models declare them with a ``str_select_related`` tuple, e.g.
+    ``Provider.str_select_related = ('user',)``.
+    """
+    paths = []
+    for name in getattr(model, 'str_select_related', ()):
+        path = f'{prefix}{name}'
+        paths.append(path)
+        related = model._meta.get_field(name).related_model
+        paths.extend(str_dependencies(related, f'{path}__'))
+    return paths
+
+
+def _resolve(model, attrs):
+    """Walk a dotted serializer source over the model relations.
+
+    Returns ``(select_paths, last_relation, remaining_model)`` where
+    ``last_relation`` is the model field reached by the whole source (or None
+    if the source ends on a column, property or method).
+    """
+    select = []
+    path = []
+    relation = None
+    for attr in attrs:
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return select, None, None
+        if not field.is_relation:
+            return select, None, None
+        path.append(attr)
+        relation = field
+        if field.many_to_many or field.one_to_many:
+            return select, field, '__'.join(path)
+        select.append('__'.join(path))
+        model = field.related_model
+    return select, relation, '__'.join(path)
+
+
+def _walk(serializer, model, prefix, select, prefetch):
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+
+        many = False
+        child = field
+        if isinstance(field, serializers.ListSerializer):
+            many, child = True, field.child
+        elif isinstance(field, ManyRelatedField):
+            many, child = True, field.child_relation
+
+        if field.source == '*':
+            if isinstance(child, serializers.BaseSerializer):
+                _walk(child, model, prefix, select, prefetch)
+            continue
+
+        attrs = field.source.split('.')
+        paths, relation, path = _resolve(model, attrs)
+
+        if relation is None:
+            # Dotted sources such as ``user.phone_number`` still load the
+            # intermediate objects.
+            select.extend(f'{prefix}{p}' for p in paths)
+            continue
+
+        related = relation.related_model
+        if relation.many_to_many or relation.one_to_many:
+            queryset = related._default_manager.all()
+            if isinstance(child, serializers.BaseSerializer):
+                queryset = prefetch_for_serializer(queryset, type(child))
+            elif not isinstance(child, PrimaryKeyRelatedField):
+                deps = str_dependencies(related)
+                if deps:
+                    queryset = queryset.select_related(*deps)
+            select.extend(f'{prefix}{p}' for p in paths)
+            prefetch.append(Prefetch(f'{prefix}{path}', queryset=queryset))
+            continue
+
+        if isinstance(child, PrimaryKeyRelatedField) and len(attrs) == 1 and relation.concrete:
+            # DRF renders forward FKs from the ``<name>_id`` column.
+            continue
+
+        select.extend(f'{prefix}{p}' for p in paths)
+        if isinstance(child, serializers.BaseSerializer):
+            _walk(child, related, f'{prefix}{path}__', select, prefetch)
+        elif isinstance(child, serializers.RelatedField):
+            select.extend(str_dependencies(related, f'{prefix}{path}__'))
+
+
+@lru_cache(maxsize=None)
+def plan_for_serializer(serializer_class):
+    """Derive ``(select_related, prefetch_related)`` lookups for a model serializer.
+
+    The plan covers every relation the serializer reads while rendering:
+    nested serializers, related fields (including the relations their
+    ``__str__`` needs) and dotted sources.
+    """
+    serializer = serializer_class()
+    model = serializer.Meta.model
+    select, prefetch = [], []
+    _walk(serializer, model, '', select, prefetch)
+    return tuple(dict.fromkeys(select)), tuple(prefetch)
+
+
+def prefetch_for_serializer(queryset, serializer_class):
+    """Apply the serializer's select/prefetch plan to ``queryset``."""
+    select, prefetch = plan_for_serializer(serializer_class)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+class PrefetchMixin:
+    """Viewset mixin shaping querysets for the serializer in use.
+
+    Applied in ``filter_queryset`` so it covers list, retrieve and every
+    action that goes through ``get_object``.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return prefetch_for_serializer(queryset, self.get_serializer_class())
@@ -0,0 +1,349 @@
+"""Read-only serializer fast path over ``.values()`` rows.
+
+A list page normally loads full model instances (plus every related
+instance ``select_related``/``prefetch_related`` brings in), and the
+serializer then reads attributes and calls ``__str__`` on each of them.
+``projection_for_serializer`` instead derives, once per serializer class,
+the exact columns the serializer reads (joined ones such as
+``client__first_name`` included), so a page is fetched with one
+``.values()`` query (plus one per nested many relation) and rendered
+straight from the row dicts.
+
+The output is the serializer's own: each value still goes through the
+field's ``to_representation`` and ``StringRelatedField`` uses the related
+model's ``str_from_values`` (the function behind its ``__str__``), with
+DRF's rules for null relations and missing attributes. Serializers using
+anything else (method fields, ``source='*'``, model properties, related
+fields of other kinds) get no projection and are rendered as usual.
+"""
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, FileField
+from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.relations import ManyRelatedField, PKOnlyObject, PrimaryKeyRelatedField, StringRelatedField
+from rest_framework.response import Response
+
+from .prefetch import prefetch_for_serializer
+
+# the parent key of the rows fetched for a nested many relation
+PARENT = '_projection_parent'
+
+
+class Unsupported(Exception):
+    """The serializer reads something a values() row cannot provide."""
+
+
+class _Skip:
+    pass
+
+
+SKIP = _Skip()
+
+
+def _missing(field):
+    """What the field renders when a forward relation on its source is null.
+
+    Mirrors ``Field.get_attribute``: the default, else None with
+    ``allow_null``, else the field is left out when not required.
+    """
+    if field.default is not empty:
+        raise Unsupported(field.field_name)
+    if field.allow_null:
+        return None
+    if not field.required:
+        return SKIP
+    raise Unsupported(field.field_name)
+
+
+def _walk_hops(model, attrs, prefix):
+    """Follow the relations of a dotted source up to its last attribute.
+
+    Returns ``(hops, model, prefix)``; each hop is ``(column, forward)``,
+    ``column`` being the relation's own column (null when it is empty).
+    """
+    hops = []
+    for attr in attrs:
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            raise Unsupported(attr)
+        if not field.is_relation or field.many_to_many or field.one_to_many:
+            raise Unsupported(attr)
+        hops.append((prefix + attr, field.concrete))
+        prefix = f'{prefix}{attr}__'
+        model = field.related_model
+    return hops, model, prefix
+
+
+class _Entry:
+    def __init__(self, name, hops, missing):
+        self.name = name
+        self.hops = hops
+        self.missing = missing
+
+    def columns(self):
+        return [column for column, _ in self.hops]
+
+    def value(self, row, field, related):
+        for column, forward in self.hops:
+            if row[column] is None:
+                # an empty forward relation raises AttributeError in DRF,
+                # an empty reverse one-to-one ObjectDoesNotExist (None)
+                return self.missing if forward else None
+        return self.render(row, field, related)
+
+
+class _Column(_Entry):
+    def __init__(self, name, hops, missing, column, model_field):
+        super().__init__(name, hops, missing)
+        self.column = column
+        self.model_field = model_field
+
+    def columns(self):
+        return super().columns() + [self.column]
+
+    def render(self, row, field, related):
+        value = row[self.column]
+        if isinstance(self.model_field, FileField):
+            value = self.model_field.attr_class(None, self.model_field, value)
+        elif value is None:
+            return None
+        return field.to_representation(value)
+
+
+class _Constant(_Entry):
+    def __init__(self, name, hops, missing, constant):
+        super().__init__(name, hops, missing)
+        self.constant = constant
+
+    def render(self, row, field, related):
+        return self.constant
+
+
+class _PrimaryKey(_Entry):
+    def __init__(self, name, hops, missing, column):
+        super().__init__(name, hops, missing)
+        self.column = column
+
+    def columns(self):
+        return super().columns() + [self.column]
+
+    def render(self, row, field, related):
+        pk = row[self.column]
+        return None if pk is None else field.to_representation(PKOnlyObject(pk=pk))
+
+
+class _String(_Entry):
+    def __init__(self, name, hops, missing, column, model, prefix):
+        super().__init__(name, hops, missing)
+        self.column = column
+        self.model = model
+        self.str_columns = [prefix + name for name in model.str_fields]
+
+    def columns(self):
+        return super().columns() + [self.column] + self.str_columns
+
+    def render(self, row, field, related):
+        if row[self.column] is None:
+            return None
+        return self.model.str_from_values(*(row[column] for column in self.str_columns))
+
+
+class _Nested(_Entry):
+    def __init__(self, name, hops, missing, column, entries):
+        super().__init__(name, hops, missing)
+        self.column = column
+        self.entries = entries
+
+    def columns(self):
+        columns = super().columns() + [self.column]
+        for entry in self.entries:
+            columns.extend(entry.columns())
+        return columns
+
+    def render(self, row, field, related):
+        if row[self.column] is None:
+            return None
+        return _render_row(self.entries, row, field.fields, related)
+
+
+class _Many(_Entry):
+    """A nested ``many=True`` serializer over a to-many relation, fetched with one extra query per page."""
+
+    def __init__(self, name, related_model, query_name, entries):
+        super().__init__(name, [], None)
+        self.related_model = related_model
+        self.query_name = query_name
+        self.entries = entries
+
+    def fetch(self, pks):
+        columns = []
+        for entry in self.entries:
+            columns.extend(entry.columns())
+        rows = (
+            self.related_model._default_manager
+            .filter(**{f'{self.query_name}__in': pks})
+            .values(*dict.fromkeys(columns), **{PARENT: F(self.query_name)})
+        )
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row[PARENT], []).append(row)
+        return grouped
+
+    def render(self, row, field, related):
+        fields = field.child.fields
+        return [_render_row(self.entries, child, fields, related) for child in related[self].get(row['pk'], ())]
+
+
+def _render_row(entries, row, fields, related):
+    data = {}
+    for entry in entries:
+        value = entry.value(row, fields[entry.name], related)
+        if value is not SKIP:
+            data[entry.name] = value
+    return data
+
+
+def _entry(field, model, prefix, top_level):
+    if field.source == '*':
+        raise Unsupported(field.field_name)
+    attrs = field.source.split('.')
+    hops, model, prefix = _walk_hops(model, attrs[:-1], prefix)
+    attr = attrs[-1]
+    missing = _missing(field) if any(forward for _, forward in hops) else None
+    try:
+        model_field = model._meta.get_field(attr)
+    except FieldDoesNotExist:
+        if hasattr(model, attr):
+            # a property or method: only an instance can provide it
+            raise Unsupported(attr)
+        # DRF leaves out (or nulls) attributes the instance does not have
+        return _Constant(field.field_name, [], None, _missing(field))
+    column = prefix + attr
+
+    if isinstance(field, serializers.ListSerializer):
+        child = field.child
+        if hops or not top_level or not (model_field.many_to_many or model_field.one_to_many):
+            raise Unsupported(attr)
+        if not isinstance(child, serializers.ModelSerializer):
+            raise Unsupported(attr)
+        query_name = model_field.related_query_name() if model_field.concrete else model_field.field.name
+        return _Many(field.field_name, model_field.related_model, query_name, _entries(child, model_field.related_model, '', False))
+
+    if isinstance(field, ManyRelatedField) or model_field.many_to_many or model_field.one_to_many:
+        raise Unsupported(attr)
+
+    if isinstance(field, serializers.BaseSerializer):
+        if not model_field.is_relation:
+            raise Unsupported(attr)
+        return _Nested(field.field_name, hops, missing, column, _entries(field, model_field.related_model, column + '__', False))
+
+    if isinstance(field, StringRelatedField):
+        if not model_field.is_relation or not hasattr(model_field.related_model, 'str_fields'):
+            raise Unsupported(attr)
+        return _String(field.field_name, hops, missing, column, model_field.related_model, column + '__')
+
+    if isinstance(field, PrimaryKeyRelatedField):
+        if not (model_field.is_relation and model_field.concrete):
+            raise Unsupported(attr)
+        return _PrimaryKey(field.field_name, hops, missing, column)
+
+    if isinstance(field, serializers.RelatedField) or model_field.is_relation:
+        raise Unsupported(attr)
+    if type(field).get_attribute is not serializers.Field.get_attribute:
+        raise Unsupported(attr)
+    return _Column(field.field_name, hops, missing, column, model_field)
+
+
+def _entries(serializer, model, prefix, top_level):
+    if not isinstance(serializer, serializers.ModelSerializer) or not issubclass(model, serializer.Meta.model):
+        raise Unsupported(type(serializer).__name__)
+    return [
+        _entry(field, model, prefix, top_level)
+        for field in serializer.fields.values()
+        if not field.write_only
+    ]
+
+
+class Projection:
+    def __init__(self, entries):
+        self.entries = entries
+        self.many = [entry for entry in entries if isinstance(entry, _Many)]
+        columns = ['pk']
+        for entry in entries:
+            columns.extend(entry.columns())
+        self.columns = tuple(dict.fromkeys(columns))
+
+    def values(self, queryset, *extra):
+        """``queryset`` as the rows the serializer needs (``extra`` columns added)."""
+        queryset = queryset.select_related(None).prefetch_related(None)
+        return queryset.values(*dict.fromkeys(self.columns + extra))
+
+    def render(self, rows, serializer):
+        """Serialized data for ``rows``, as ``serializer`` (a ``many=True``-less instance) would render the objects."""
+        rows = list(rows)
+        pks = [row['pk'] for row in rows]
+        # rows of the nested many relations, by parent pk
+        related = {entry: entry.fetch(pks) if pks else {} for entry in self.many}
+        fields = serializer.fields
+        return [_render_row(self.entries, row, fields, related) for row in rows]
+
+
+@lru_cache(maxsize=None)
+def projection_for_serializer(serializer_class):
+    """The ``Projection`` of a model serializer, or None if it cannot have one."""
+    serializer = serializer_class()
+    try:
+        return Projection(_entries(serializer, serializer.Meta.model, '', True))
+    except Unsupported:
+        return None
+
+
+class ProjectionMixin:
+    """Viewset mixin serving ``list`` from ``.values()`` rows.
+
+    Used whenever the list serializer has a projection; the queryset,
+    filters and pagination are the regular ones.
+    """
+
+    def get_list_queryset(self):
+        return self.filter_queryset(self.get_queryset())
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_list_queryset()
+        projection = projection_for_serializer(self.get_serializer_class())
+        if projection is None:
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                return self.get_paginated_response(self.get_serializer(page, many=True).data)
+            return Response(self.get_serializer(queryset, many=True).data)
+        serializer = self.get_serializer()
+        ordering = ()
+        if self.paginator is not None and hasattr(self.paginator, 'get_ordering'):
+            # the paginator reads its cursor position from the ordering columns
+            ordering = tuple(name.lstrip('-') for name in self.paginator.get_ordering(request, self))
+        rows = projection.values(queryset, *ordering)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(projection.render(page, serializer))
+        return Response(projection.render(rows, serializer))
+
+
+def paginated_response(queryset, serializer_class, paginator, request, view):
+    """A page of ``queryset`` rendered by ``serializer_class``, for extra actions.
+
+    Uses the projection when the serializer has one, else instances
+    loaded with ``prefetch_for_serializer``.
+    """
+    projection = projection_for_serializer(serializer_class)
+    serializer = serializer_class(context={'request': request, 'view': view})
+    if projection is None:
+        page = paginator.paginate_queryset(prefetch_for_serializer(queryset, serializer_class), request, view=view)
+        return paginator.get_paginated_response(serializer_class(page, many=True, context=serializer.context).data)
+    ordering = ()
+    if hasattr(paginator, 'get_ordering'):
+        ordering = tuple(name.lstrip('-') for name in paginator.get_ordering(request, view))
+    page = paginator.paginate_queryset(projection.values(queryset, *ordering), request, view=view)
+    return paginator.get_paginated_response(projection.render(page, serializer))
@@ -0,0 +1,91 @@
+"""orjson-backed JSON renderer.
+
+``ORJSONRenderer`` produces the same bytes as DRF's ``JSONRenderer`` with
+the default ``COMPACT_JSON``/``UNICODE_JSON`` settings, several times
+faster. Datetimes, dates, times, timedeltas, UUIDs and every other
+non-native type go through DRF's own ``JSONEncoder.default``. ``Decimal``
+is written as DRF writes it, as a float; for values whose float repr
+would use an exponent, the stdlib encoder renders the whole response.
+Whatever orjson cannot encode the same way (non-string keys, integers
+beyond 64 bits, indented or ASCII-only output) falls back to the stdlib
+renderer, which also raises the same errors. Plain ``float`` values
+(coordinates) are written by orjson itself and only match ``repr()`` in
+the same range as decimals: below it orjson writes ``0.00001`` for
+``1e-05`` (``1e-7`` for ``1e-07`` further down), above it ``1e16`` for
+``1e+16``. orjson has no
+hook for floats, so the output is checked for such numbers and rendered
+again by the stdlib when one is found. Dataclasses are handed to
+``_default`` like any other non-native type, so they raise the same
+``TypeError`` as under DRF.
+
+Two inputs DRF rejects are still written by orjson, which has no hook for
+either and a walk of the data to find them costs more than the stdlib
+render: NaN and infinities (``null``; DRF raises ``ValueError`` under
+``STRICT_JSON``) and ``Enum`` members that are not ``int``/``str``/``float``
+(their value; DRF raises ``TypeError``). The API's own payloads have
+neither: their floats are coordinates, whose validators reject non-finite
+values, and the distances and scores computed from them.
+
+Without orjson installed the renderer is the stdlib one.
+"""
+from decimal import Decimal
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class _Fallback(Exception):
+    pass
+
+
+_encoder = JSONEncoder()
+
+# keeps e, maps digits and minus signs to 0: an exponent becomes 0e0
+_EXPONENT_CHARS = bytes(ord('0') if c in b'0123456789-' else c if c == ord('e') else ord(' ') for c in range(256))
+
+
+def _non_repr_floats(ret):
+    """Whether orjson may have written a float unlike ``repr()``.
+
+    That is below 1e-4 without an exponent, or with one. A string looking
+    like either only costs a fallback; scanning the output is cheaper than
+    a regex or a walk of the data.
+    """
+    return b'0.0000' in ret or b'0e0' in ret.translate(_EXPONENT_CHARS)
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        value = float(obj)
+        # the range where orjson and repr() write floats identically
+        if value == 0 or 1e-4 <= abs(value) < 1e16:
+            return value
+        raise _Fallback
+    return _encoder.default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS if orjson is not None else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if _non_repr_floats(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+        # same escaping as JSONRenderer: keep the output a strict javascript subset
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,144 @@
+"""Full-text search of model text columns, ranked and keyset-paginated.
+
+A ``SearchIndex`` names the columns of a table to search and their weight
+(``'A'``, the strongest, to ``'D'``, as in PostgreSQL). Its index lives
+outside the model fields and is created by a migration with
+``install()``, in the form the database supports:
+
+- PostgreSQL: a generated ``search_vector`` column (``tsvector`` with the
+  Portuguese configuration) and a GIN index on it. The database computes
+  the column on every INSERT and UPDATE.
+- SQLite: an FTS5 table using the model's table as external content,
+  kept current by triggers on INSERT, UPDATE and DELETE. This includes
+  ``update()``, ``bulk_create()`` and raw SQL, which send no signals.
+  A later migration that makes SQLite rebuild the table (``AlterField``
+  and the like) drops the triggers, so it must call ``install()`` again.
+
+The PostgreSQL configuration reduces words to their stem but keeps
+accents; the SQLite tokenizer ignores accents but does not stem, so its
+queries match each word as a prefix instead (``fts_query``).
+
+``search()`` filters a queryset to the rows matching the words and
+annotates their ``rank``, higher being better. ``SearchPagination``
+pages through them on ``(rank, id)``, so any queryset of visible rows
+(a provider's feed, a client's requests) can be searched and paged.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+from .pagination import KeysetPagination
+
+# text search configuration of the PostgreSQL index
+CONFIG = 'portuguese'
+# relative weights of A, B, C and D: ts_rank's defaults, reused for bm25
+WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+RANK = 'rank'
+
+
+class SearchIndex:
+    def __init__(self, name, columns):
+        # name of the FTS5 table (SQLite); the GIN index is f'{name}_idx'
+        self.name = name
+        # ((column, weight), ...)
+        self.columns = tuple(columns)
+
+    def install(self, schema_editor, table):
+        """Create the index of ``table`` and fill it with the current rows."""
+        for statement in self._sql(schema_editor, table):
+            schema_editor.execute(statement)
+
+    def uninstall(self, schema_editor, table):
+        for statement in self._reverse_sql(schema_editor, table):
+            schema_editor.execute(statement)
+
+    def _sql(self, schema_editor, table):
+        quote = schema_editor.quote_name
+        vendor = schema_editor.connection.vendor
+        if vendor == 'postgresql':
+            vector = ' || '.join(
+                f"setweight(to_tsvector('{CONFIG}'::regconfig, coalesce({quote(column)}, '')), '{weight}')"
+                for column, weight in self.columns
+            )
+            return [
+                f'ALTER TABLE {quote(table)} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({vector}) STORED',
+                f'CREATE INDEX {quote(self.name + "_idx")} ON {quote(table)} USING GIN (search_vector)',
+            ]
+        if vendor == 'sqlite':
+            columns = ', '.join(quote(column) for column, _ in self.columns)
+            new = ', '.join(f'new.{quote(column)}' for column, _ in self.columns)
+            old = ', '.join(f'old.{quote(column)}' for column, _ in self.columns)
+            fts = quote(self.name)
+            delete = f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old});"
+            insert = f'INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new});'
+            return [
+                f'CREATE VIRTUAL TABLE {fts} USING fts5({columns}, content={quote(table)}, content_rowid=id, '
+                f"tokenize='unicode61 remove_diacritics 2')",
+                f'CREATE TRIGGER {quote(self.name + "_ai")} AFTER INSERT ON {quote(table)} BEGIN {insert} END',
+                f'CREATE TRIGGER {quote(self.name + "_ad")} AFTER DELETE ON {quote(table)} BEGIN {delete} END',
+                f'CREATE TRIGGER {quote(self.name + "_au")} AFTER UPDATE OF {columns} ON {quote(table)} '
+                f'BEGIN {delete} {insert} END',
+                f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+            ]
+        raise NotImplementedError(f'Full-text search is not supported on {vendor}.')
+
+    def _reverse_sql(self, schema_editor, table):
+        quote = schema_editor.quote_name
+        if schema_editor.connection.vendor == 'postgresql':
+            return [
+                f'DROP INDEX IF EXISTS {quote(self.name + "_idx")}',
+                f'ALTER TABLE {quote(table)} DROP COLUMN IF EXISTS search_vector',
+            ]
+        return [
+            *(f'DROP TRIGGER IF EXISTS {quote(self.name + suffix)}' for suffix in ('_ai', '_ad', '_au')),
+            f'DROP TABLE IF EXISTS {quote(self.name)}',
+        ]
+
+    def search(self, queryset, text):
+        """``queryset`` reduced to the rows matching the words of ``text``, annotated with ``rank``."""
+        connection = connections[queryset.db]
+        quote = connection.ops.quote_name
+        table = quote(queryset.model._meta.db_table)
+        if connection.vendor == 'postgresql':
+            vector = f'{table}.search_vector'
+            query = f"websearch_to_tsquery('{CONFIG}'::regconfig, %s)"
+            match = RawSQL(f'{vector} @@ {query}', [text], output_field=BooleanField())
+            # float8: the cursor must carry the exact rank back
+            rank = RawSQL(f'ts_rank_cd({vector}, {query})::float8', [text], output_field=FloatField())
+            return queryset.filter(match).annotate(**{RANK: rank})
+
+        query = fts_query(text)
+        if not query:
+            # nothing to match (the text had no words); still annotated, as
+            # SearchPagination orders on the rank
+            return queryset.none().annotate(**{RANK: Value(0.0, output_field=FloatField())})
+        fts = quote(self.name)
+        weights = ', '.join(str(WEIGHTS[weight]) for _, weight in self.columns)
+        matches = f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s'
+        # bm25() only works in the query that runs the MATCH, and repeating
+        # that MATCH once per row is quadratic; the LIMIT keeps SQLite from
+        # flattening the scored matches into the correlated subquery, so they
+        # are computed once and looked up by rowid. bm25 is lower for better
+        # matches.
+        scores = f'SELECT rowid AS id, -bm25({fts}, {weights}) AS score FROM {fts} WHERE {fts} MATCH %s LIMIT -1'
+        pk = f'{table}.{quote(queryset.model._meta.pk.column)}'
+        rank = RawSQL(f'(SELECT scores.score FROM ({scores}) AS scores WHERE scores.id = {pk})', [query], output_field=FloatField())
+        return queryset.filter(pk__in=RawSQL(matches, [query])).annotate(**{RANK: rank})
+
+
+def fts_query(text):
+    """FTS5 query for the words of ``text``: all of them, each as a prefix.
+
+    Prefixes stand in for the stemming of the PostgreSQL configuration
+    (``eletric`` finds ``eletricista``); quoting keeps FTS5 operators in
+    the input from being interpreted.
+    """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text.lower()))
+
+
+class SearchPagination(KeysetPagination):
+    """Best match first, for querysets from ``SearchIndex.search()``."""
+
+    ordering = (f'-{RANK}', '-id')
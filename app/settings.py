@@ -185,15 +185,61 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.CustomUser'
 
+# Cache
+# Local memory by default; set CACHE_BACKEND/CACHE_LOCATION to share it
+# between processes (e.g. django.core.cache.backends.redis.RedisCache).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
+    # rendered responses of the public provider listing (providers.cache);
+    # file based works too, e.g. RESPONSE_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+    'responses': {
+        'BACKEND': os.getenv('RESPONSE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION', 'responses'),
+        'TIMEOUT': int(os.getenv('RESPONSE_CACHE_TTL', '300')),
+    },
+}
+
+# Response cache of the provider listing for anonymous and non-provider users
+PROVIDER_LIST_CACHE_ALIAS = 'responses'
+
+# Per-process snapshot of the service-type catalog (services.catalog). Edits
+# reach other processes at once through a shared default cache; with the
+# local-memory one, only when their snapshot is this many seconds old.
+SERVICE_TYPE_CATALOG_MAX_AGE = int(os.getenv('SERVICE_TYPE_CATALOG_MAX_AGE', '60'))
+
+# Per-process cache of JWT-authenticated users (users.authentication).
+# Changes to a user reach other processes at once through a shared default
+# cache; with the local-memory one, only when their entry is USER_CACHE_TTL
+# seconds old, the window in which a deactivated user or a changed password
+# is still accepted there.
+USER_CACHE_ALIAS = 'default'
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '1024'))
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '60'))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # orjson-backed, same output as DRF's JSONRenderer/JSONParser (app.renderers)
+    'DEFAULT_RENDERER_CLASSES': (
+        'app.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'app.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_PAGINATION_CLASS': 'app.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
 }
 
 SIMPLE_JWT = {
@@ -209,6 +255,23 @@ SPECTACULAR_SETTINGS = {
     'VERSION': '1.0.0',
 }
 
+# Job stream (servicerequests.stream). The in-memory broker only reaches
+# providers connected to the same process; point this at a shared backend
+# when running several ASGI workers.
+SERVICE_REQUEST_BROKER = os.getenv('SERVICE_REQUEST_BROKER', 'servicerequests.broker.InMemoryBroker')
+SERVICE_REQUEST_STREAM_HEARTBEAT = int(os.getenv('SERVICE_REQUEST_STREAM_HEARTBEAT', '15'))
+
+# Ranking index of candidate providers (servicerequests.matching). Without a
+# shared default cache a process only sees its own changes to providers, so
+# every index is also rebuilt in the background once it is this many
+# seconds old.
+SERVICE_REQUEST_RANKING_MAX_AGE = int(os.getenv('SERVICE_REQUEST_RANKING_MAX_AGE', '300'))
+
+# Geocoding of addresses (app.geo). The default works offline from a table
+# of place names: the built-in one or a CSV of name,latitude,longitude rows.
+GEOCODER = os.getenv('GEOCODER', 'app.geo.TableGeocoder')
+GEOCODER_TABLE = os.getenv('GEOCODER_TABLE') or None
+
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
 ]
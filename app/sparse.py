@@ -0,0 +1,118 @@
+"""Sparse fieldsets (``?fields=``) and opt-in expansion (``?expand=``).
+
+``?fields=id,title,status`` limits a GET response to those fields and
+``?expand=provider`` renders a relation as a nested object instead of its
+compact form (a string or an id); serializers list what can be expanded
+in ``expandable_fields``. Each combination is a cached subclass of the
+serializer (``sparse_serializer_class``), so the select/prefetch plan of
+``app.prefetch`` and the projection of ``app.projection``, both derived
+per serializer class, only read what the response contains: fields that
+were not asked for cost no column, join or prefetch.
+"""
+from functools import lru_cache
+
+from rest_framework.exceptions import ValidationError
+
+from .projection import projection_for_serializer
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def _names(request, param):
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+@lru_cache(maxsize=None)
+def _fields(serializer_class):
+    """``{name: write_only}`` for the fields of ``serializer_class``."""
+    return {name: field.write_only for name, field in serializer_class().fields.items()}
+
+
+@lru_cache(maxsize=256)
+def _variant(serializer_class, fields, expand):
+    expandable = getattr(serializer_class, 'expandable_fields', {})
+    attrs = {name: expandable[name](read_only=True) for name in expand}
+    # write-only fields stay: they are not rendered anyway
+    meta_fields = [name for name, write_only in _fields(serializer_class).items() if write_only or name in fields]
+    for name in serializer_class._declared_fields:
+        if name not in meta_fields:
+            # removes the inherited declaration
+            attrs[name] = None
+    attrs['Meta'] = type('Meta', (serializer_class.Meta,), {'fields': meta_fields})
+    label = ','.join(fields) + (f';expand={",".join(expand)}' if expand else '')
+    return type(serializer_class)(f'{serializer_class.__name__}[{label}]', (serializer_class,), attrs)
+
+
+def is_sparse(request):
+    """Whether the request uses ``?fields=`` or ``?expand=``."""
+    return FIELDS_PARAM in request.query_params or EXPAND_PARAM in request.query_params
+
+
+def sparse_serializer_class(serializer_class, request):
+    """``serializer_class`` reduced to the request's ``fields`` and with its ``expand`` relations nested.
+
+    Returns ``serializer_class`` itself when neither parameter is given;
+    unknown names are a 400.
+    """
+    if not is_sparse(request):
+        return serializer_class
+    fields = _names(request, FIELDS_PARAM)
+    expand = _names(request, EXPAND_PARAM)
+    available = [name for name, write_only in _fields(serializer_class).items() if not write_only]
+    expandable = getattr(serializer_class, 'expandable_fields', {})
+    errors = {}
+    if fields is not None:
+        unknown = [name for name in fields if name not in available]
+        if unknown:
+            errors[FIELDS_PARAM] = f'Unknown field(s): {", ".join(unknown)}. Use: {", ".join(available)}.'
+    if expand:
+        unknown = [name for name in expand if name not in expandable]
+        if unknown:
+            choices = ', '.join(expandable) or 'nothing can be expanded here'
+            errors[EXPAND_PARAM] = f'Cannot expand: {", ".join(unknown)}. Use: {choices}.'
+    if errors:
+        raise ValidationError(errors)
+    expand = tuple(sorted(set(expand or ())))
+    # expanded relations are always part of the response
+    fields = tuple(name for name in available if fields is None or name in fields or name in expand)
+    return _variant(serializer_class, fields, expand)
+
+
+def deferred_queryset(queryset, serializer_class):
+    """``queryset`` loading only the columns ``serializer_class`` reads.
+
+    Relations have to be select_related already (``app.prefetch`` does it);
+    serializers without a projection get the queryset unchanged.
+    """
+    projection = projection_for_serializer(serializer_class)
+    if projection is None:
+        return queryset
+    return queryset.only(*projection.columns)
+
+
+class SparseFieldsetMixin:
+    """Viewset mixin applying ``?fields=`` and ``?expand=`` to ``list`` and ``retrieve``.
+
+    Goes before ``PrefetchMixin`` and ``ProjectionMixin``, which then see
+    the reduced serializer; instance querysets are also limited to the
+    columns it reads. Extra actions rendering another serializer call
+    ``sparse_serializer_class`` themselves.
+    """
+
+    sparse_actions = ('list', 'retrieve')
+
+    def get_serializer_class(self):
+        serializer_class = super().get_serializer_class()
+        if getattr(self, 'action', None) not in self.sparse_actions:
+            return serializer_class
+        return sparse_serializer_class(serializer_class, self.request)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if getattr(self, 'action', None) in self.sparse_actions and is_sparse(self.request):
+            queryset = deferred_queryset(queryset, self.get_serializer_class())
+        return queryset
@@ -30,6 +30,7 @@ from services.views import ServiceTypeViewSet
 from providers.views import ProviderViewSet
 from providers.views import ProviderApplicationViewSet
 from servicerequests.views import ServiceRequestViewSet
+from servicerequests.stream import job_stream
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
 
@@ -47,6 +48,8 @@ urlpatterns = [
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
+    # before the router, which would read "stream" as a service request id
+    path('api/service-requests/stream/', job_stream, name='service-request-stream'),
     path('api/', include(router.urls)),   
     path('api-auth/', include('rest_framework.urls')),
     path('api/current/', CurrentUserView.as_view(), name='current-user'),
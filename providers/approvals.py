@@ -0,0 +1,115 @@
+"""Approval of provider applications, one or thousands at a time.
+
+``approve_many`` checks every application with a few set-based queries
+(status, applicants that already have a provider profile, CPF/CNPJ taken
+by an existing provider or by an earlier application of the same batch),
+then creates the providers and their service types with two bulk INSERTs
+and flags the applicants with one UPDATE, all in one transaction. As
+``bulk_create`` and ``update`` send no model signals, the provider listing
+cache, the applicants' cached users and the ranking index are updated
+here.
+"""
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+from servicerequests.matching import providers_changed
+from users.authentication import invalidate_users
+from .cache import invalidate_provider_list
+from .models import Provider, ProviderApplication
+
+User = get_user_model()
+
+
+class ApprovalError(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+
+
+class ApprovalConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Some of these applications changed, try again.'
+
+
+def _check(rows, pks):
+    """``(approvable rows, {pk: error})`` for the applications ``pks``, in that order."""
+    applicant_ids = {row['applicant_id'] for row in rows.values()}
+    cpf_cnpjs = {row['cpf_cnpj'] for row in rows.values()}
+    with_profile = set(Provider.objects.filter(user_id__in=applicant_ids).values_list('user_id', flat=True))
+    taken = set(Provider.objects.filter(cpf_cnpj__in=cpf_cnpjs).values_list('cpf_cnpj', flat=True))
+
+    approvable = []
+    errors = {}
+    batch_applicants = set()
+    batch_cpf_cnpjs = set()
+    for pk in pks:
+        row = rows.get(pk)
+        if row is None:
+            errors[pk] = NotFound()
+        elif row['status'] != ProviderApplication.STATUS_PENDING:
+            errors[pk] = ApprovalError('Application already reviewed.')
+        elif row['applicant_id'] in with_profile:
+            errors[pk] = ApprovalError('Applicant already has a provider profile.')
+        elif row['applicant_id'] in batch_applicants:
+            errors[pk] = ApprovalError('Another application of this applicant is approved in this batch.')
+        elif row['cpf_cnpj'] in taken:
+            errors[pk] = ApprovalError('A provider with this CPF/CNPJ already exists.')
+        elif row['cpf_cnpj'] in batch_cpf_cnpjs:
+            errors[pk] = ApprovalError('Another application with this CPF/CNPJ is approved in this batch.')
+        else:
+            approvable.append(row)
+            batch_applicants.add(row['applicant_id'])
+            batch_cpf_cnpjs.add(row['cpf_cnpj'])
+    return approvable, errors
+
+
+def approve_many(pks, reviewer):
+    """Approve the provider applications ``pks``, creating a provider for each.
+
+    Returns ``({pk: provider_id}, {pk: error})``: the applications approved
+    and, for the others, the ``APIException`` explaining why not. Raises
+    ``ApprovalConflict`` when a provider appeared concurrently for one of
+    the applicants; nothing is approved then.
+    """
+    with transaction.atomic():
+        rows = (
+            ProviderApplication.objects.select_for_update()
+            .filter(pk__in=pks)
+            .values('pk', 'applicant_id', 'nickname', 'description', 'cpf_cnpj', 'status')
+        )
+        approvable, errors = _check({row['pk']: row for row in rows}, pks)
+        if not approvable:
+            return {}, errors
+
+        try:
+            providers = Provider.objects.bulk_create([
+                Provider(user_id=row['applicant_id'], nickname=row['nickname'], description=row['description'], cpf_cnpj=row['cpf_cnpj'])
+                for row in approvable
+            ])
+        except IntegrityError:
+            raise ApprovalConflict()
+        user_ids = [row['applicant_id'] for row in approvable]
+        if providers[0].pk is None:
+            # backends that cannot return the new primary keys
+            providers = Provider.objects.filter(user_id__in=user_ids).only('pk', 'user_id')
+        provider_ids = {provider.user_id: provider.pk for provider in providers}
+        provider_for = {row['pk']: provider_ids[row['applicant_id']] for row in approvable}
+
+        service_types = ProviderApplication.service_types.through.objects.filter(providerapplication_id__in=provider_for)
+        Provider.service_types.through.objects.bulk_create([
+            Provider.service_types.through(provider_id=provider_for[application_id], servicetype_id=service_type_id)
+            for application_id, service_type_id in service_types.values_list('providerapplication_id', 'servicetype_id')
+        ])
+
+        now = timezone.now()
+        ProviderApplication.objects.filter(pk__in=provider_for).update(
+            status=ProviderApplication.STATUS_APPROVED, reviewer=reviewer, reviewed_at=now, updated_at=now,
+        )
+        User.objects.filter(pk__in=user_ids).update(is_provider=True)
+
+        # the new profiles are part of the applicants' token claims
+        invalidate_users(user_ids)
+        transaction.on_commit(lambda: invalidate_users(user_ids))
+        invalidate_provider_list()
+        providers_changed(provider_for.values())
+    return provider_for, errors
@@ -0,0 +1,58 @@
+"""Response cache for the public provider listing.
+
+Anonymous and non-provider users all see the same provider list, so its
+rendered JSON pages are kept in the ``PROVIDER_LIST_CACHE_ALIAS`` cache,
+keyed by the full request URI (query parameters included). Every key
+carries a generation tag; ``invalidate_provider_list`` replaces the tag
+whenever something the listing shows changes (see ``providers.signals``),
+and the old entries simply expire.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+GENERATION_KEY = 'providers:list:generation'
+
+
+def _cache():
+    return caches[getattr(settings, 'PROVIDER_LIST_CACHE_ALIAS', 'responses')]
+
+
+def _generation():
+    cache = _cache()
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, uuid.uuid4().hex, timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def _bump():
+    _cache().set(GENERATION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def invalidate_provider_list():
+    """Drop every cached page of the provider listing."""
+    _bump()
+    # again once committed, so a page rendered from the pre-commit rows is
+    # not kept under the new generation
+    transaction.on_commit(_bump)
+
+
+def cache_key(request):
+    uri = request.build_absolute_uri()
+    media_type = request.accepted_media_type or ''
+    digest = hashlib.sha1(f'{media_type}\n{uri}'.encode('utf-8')).hexdigest()
+    return f'providers:list:{_generation()}:{digest}'
+
+
+def get_page(key):
+    """``(content, content_type, etag)`` cached under ``key``, or None."""
+    return _cache().get(key)
+
+
+def set_page(key, response):
+    _cache().set(key, (response.content, response['Content-Type'], response.get('ETag')))
@@ -0,0 +1,86 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Exists, OuterRef
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Provider
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+FALSE_VALUES = ('0', 'false', 'no', 'off')
+
+
+def parse_bool(value):
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(value)
+
+
+class ProviderFilterBackend(BaseFilterBackend):
+    """Marketplace filters for the provider list.
+
+    Query parameters:
+    - ``service_type``: service type id, or several separated by commas
+      (providers offering any of them)
+    - ``is_active``: true/false
+    - ``min_stars``: minimum rating, 0 to 5
+    - ``q``: text contained in the nickname (case-insensitive)
+
+    The ``(is_active, stars, id)`` and ``(stars, id)`` indexes serve the
+    ordering used by ``ProviderPagination``. The service type test is an
+    EXISTS probe on the unique ``(provider_id, servicetype_id)`` index of the
+    through table, so it never multiplies rows and needs no DISTINCT.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        errors = {}
+
+        if params.get('service_type'):
+            try:
+                service_type_ids = [int(pk) for pk in params['service_type'].split(',') if pk.strip()]
+            except ValueError:
+                errors['service_type'] = 'Use a service type id or a comma-separated list of ids.'
+            else:
+                offers = Provider.service_types.through.objects.filter(
+                    provider_id=OuterRef('pk'), servicetype_id__in=service_type_ids,
+                )
+                queryset = queryset.filter(Exists(offers))
+
+        if params.get('is_active'):
+            try:
+                queryset = queryset.filter(is_active=parse_bool(params['is_active']))
+            except ValueError:
+                errors['is_active'] = 'Invalid value for is_active; use true/false.'
+
+        if params.get('min_stars'):
+            try:
+                min_stars = Decimal(params['min_stars'])
+                if not Decimal('0') <= min_stars <= Decimal('5'):
+                    raise InvalidOperation
+            except InvalidOperation:
+                errors['min_stars'] = 'Use a number between 0 and 5.'
+            else:
+                queryset = queryset.filter(stars__gte=min_stars)
+
+        # the search action matches q against the full-text index instead
+        if params.get('q') and getattr(view, 'action', None) != 'search':
+            queryset = queryset.filter(nickname__icontains=params['q'].strip())
+
+        if errors:
+            raise ValidationError(errors)
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        def parameter(name, description, schema):
+            return {'name': name, 'required': False, 'in': 'query', 'description': description, 'schema': schema}
+
+        return [
+            parameter('service_type', 'Service type id, or comma-separated ids.', {'type': 'string'}),
+            parameter('is_active', 'Only active (true) or inactive (false) providers.', {'type': 'boolean'}),
+            parameter('min_stars', 'Minimum rating (0-5).', {'type': 'number'}),
+            parameter('q', 'Text contained in the nickname.', {'type': 'string'}),
+        ]
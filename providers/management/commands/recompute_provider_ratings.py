@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db.models.functions import Now
+from providers.cache import invalidate_provider_list
+from providers.models import Provider
+from providers.ratings import recompute_rating_totals
+from servicerequests.matching import providers_changed
+from servicerequests.models import Rating
+
+
+class Command(BaseCommand):
+    help = 'Recompute every provider\'s rating_count, rating_sum and stars from the ratings table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--provider', type=int, action='append', default=[], help='Only this provider id (repeatable)')
+
+    def handle(self, *args, **options):
+        providers = Provider.objects.all()
+        if options['provider']:
+            providers = providers.filter(pk__in=options['provider'])
+        updated = recompute_rating_totals(providers, Rating.objects.all(), updated_at=Now())
+        invalidate_provider_list()
+        providers_changed(options['provider'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Recomputed rating totals for {updated} provider(s).'))
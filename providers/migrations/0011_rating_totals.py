@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:14
+
+from decimal import Decimal
+from django.db import migrations, models
+from providers.ratings import recompute_rating_totals
+
+
+def backfill_rating_totals(apps, schema_editor):
+    Provider = apps.get_model('providers', 'Provider')
+    Rating = apps.get_model('servicerequests', 'Rating')
+    recompute_rating_totals(Provider.objects.all(), Rating.objects.all())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0010_alter_provider_cpf_cnpj'),
+        ('servicerequests', '0004_servicerequest_provider_servicerequest_status_rating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='provider',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='provider',
+            name='rating_sum',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.RunPython(backfill_rating_totals, migrations.RunPython.noop),
+    ]
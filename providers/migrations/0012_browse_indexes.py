@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0011_rating_totals'),
+        ('services', '0002_remove_servicetype_description'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='provider',
+            index=models.Index(fields=['is_active', '-stars', '-id'], name='provider_active_stars_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='provider',
+            index=models.Index(fields=['-stars', '-id'], name='provider_stars_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0013_updated_at'),
+        ('services', '0002_remove_servicetype_description'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='providerapplication',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['created_at', 'id'], name='app_pending_created_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+from app.search import SearchIndex
+
+INDEX = SearchIndex('provider_search', (('nickname', 'A'), ('description', 'B')))
+
+
+def install(apps, schema_editor):
+    INDEX.install(schema_editor, apps.get_model('providers', 'Provider')._meta.db_table)
+
+
+def uninstall(apps, schema_editor):
+    INDEX.uninstall(schema_editor, apps.get_model('providers', 'Provider')._meta.db_table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0014_review_queue_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
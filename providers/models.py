@@ -1,8 +1,11 @@
 from django.db import models
+from django.db.models.functions import Now, Round
 from django.conf import settings
 from services.models import ServiceType
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
+from app import geo
+from app.search import SearchIndex
 
 class Provider(models.Model):
     user = models.OneToOneField(
@@ -20,14 +23,100 @@ class Provider(models.Model):
         default=Decimal('0.00'),
         validators=[MinValueValidator(0.0), MaxValueValidator(5.0)],
     )
+    # running totals of the provider's ratings; stars is rating_sum / rating_count
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
 
     cpf_cnpj = models.CharField(max_length=18, unique=True, help_text="CPF ou CNPJ do provider", default="")
     is_active = models.BooleanField(default=False)
     service_types = models.ManyToManyField(ServiceType, related_name='providers')
+    # bumped by every change to the provider's payload (conditional GET)
+    updated_at = models.DateTimeField(auto_now=True)
 
+    # relations read by __str__, used by app.prefetch
+    str_select_related = ('user',)
+    # columns read by __str__, used by app.projection
+    str_fields = ('user__username', 'stars')
+
+    # full-text index of the nickname and description, created by migration 0015
+    search_index = SearchIndex('provider_search', (('nickname', 'A'), ('description', 'B')))
+
+    # written only through rating_changes(), never by a full save()
+    RATING_FIELDS = ('stars', 'rating_count', 'rating_sum')
+
+    class Meta:
+        indexes = [
+            # marketplace browse: best rated first, optionally only active ones
+            models.Index(fields=['is_active', '-stars', '-id'], name='provider_active_stars_idx'),
+            models.Index(fields=['-stars', '-id'], name='provider_stars_idx'),
+        ]
+
+    @staticmethod
+    def str_from_values(username, stars):
+        return f"Provider: {username} - Stars: {stars}"
 
     def __str__(self):
-        return f"Provider: {self.user.username} - Stars: {self.stars}"
+        return self.str_from_values(self.user.username, self.stars)
+
+    # first radius tried by nearest(), widened fourfold until enough are found
+    NEAREST_FIRST_KM = 2
+
+    @classmethod
+    def nearest(cls, latitude, longitude, k, max_km, service_type_id=None, exclude_user_id=None):
+        """``[(distance_km, pk), ...]`` of the ``k`` active providers nearest to the point.
+
+        A provider is where its user is located. The search starts with a
+        small circle and widens it up to ``max_km``, each step reading a few
+        geohash ranges of the users' ``geohash`` index (``app.geo.cover``).
+        """
+        providers = cls.objects.filter(is_active=True)
+        if service_type_id is not None:
+            providers = providers.filter(service_types=service_type_id)
+        if exclude_user_id is not None:
+            providers = providers.exclude(user_id=exclude_user_id)
+        km = min(cls.NEAREST_FIRST_KM, max_km)
+        while True:
+            rows = providers.filter(geo.cover_q('user__geohash', latitude, longitude, km))
+            found = geo.within(rows.values_list('pk', 'user__latitude', 'user__longitude'), latitude, longitude, km)
+            if len(found) >= k or km >= max_km:
+                return [(distance, row[0]) for distance, row in found[:k]]
+            km = min(km * 4, max_km)
+
+    def save(self, *args, **kwargs):
+        # a full save() of a loaded provider would write back stale rating
+        # totals over concurrent F() updates, so it leaves them out
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.RATING_FIELDS
+            ]
+        # auto_now only writes updated_at when it is among update_fields
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'updated_at' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'updated_at']
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def rating_changes(count, score):
+        """``update()`` kwargs adding ``count`` ratings totalling ``score``.
+
+        ``count`` and ``score`` are negative to take ratings away. The new
+        ``stars`` is computed in the same statement from the old totals, so
+        concurrent ratings cannot overwrite each other.
+        """
+        new_count = models.F('rating_count') + count
+        new_sum = models.F('rating_sum') + score
+        return {
+            'updated_at': Now(),
+            'rating_count': new_count,
+            'rating_sum': new_sum,
+            'stars': models.Case(
+                models.When(rating_count__lte=-count, then=models.Value(Decimal('0.00'))),
+                # the 1.0 keeps SQLite from doing integer division
+                default=Round(new_sum * models.Value(Decimal('1.0')) / new_count, 2),
+                output_field=models.DecimalField(max_digits=3, decimal_places=2),
+            ),
+        }
 
 
 class ProviderApplication(models.Model):
@@ -50,9 +139,29 @@ class ProviderApplication(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     reviewed_at = models.DateTimeField(null=True, blank=True)
     reviewer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='reviewed_provider_applications')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    str_select_related = ('applicant',)
+
+    # review queue: oldest pending application first; id breaks ties
+    REVIEW_ORDERING = ('created_at', 'id')
 
     class Meta:
         unique_together = ('applicant', 'cpf_cnpj')
+        indexes = [
+            # review queue, see REVIEW_ORDERING
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(status='PENDING'),
+                name='app_pending_created_idx',
+            ),
+        ]
 
     def __str__(self):
-        return f"ProviderApplication: {self.applicant.username} - {self.status}"
\ No newline at end of file
+        return f"ProviderApplication: {self.applicant.username} - {self.status}"
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'updated_at' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'updated_at']
+        super().save(*args, **kwargs)
\ No newline at end of file
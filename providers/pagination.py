@@ -0,0 +1,38 @@
+from rest_framework.exceptions import ValidationError
+from app.pagination import KeysetPagination
+from .models import ProviderApplication
+
+
+class ProviderPagination(KeysetPagination):
+    """Best rated first; ``?ordering=stars`` lists the lowest rated first."""
+
+    ordering = ('-stars', '-id')
+    ordering_query_param = 'ordering'
+    orderings = {
+        'stars': ('stars', 'id'),
+        '-stars': ('-stars', '-id'),
+    }
+
+    def get_ordering(self, request, view=None):
+        value = request.query_params.get(self.ordering_query_param)
+        if not value:
+            return self.ordering
+        try:
+            return self.orderings[value]
+        except KeyError:
+            raise ValidationError({self.ordering_query_param: f'Use one of: {", ".join(self.orderings)}.'})
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.ordering_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Sort by rating: -stars (default) or stars.',
+            'schema': {'type': 'string', 'enum': list(self.orderings)},
+        })
+        return parameters
+
+
+class ReviewQueuePagination(KeysetPagination):
+    ordering = ProviderApplication.REVIEW_ORDERING
@@ -0,0 +1,21 @@
+from decimal import Decimal
+from django.db.models import Avg, Count, DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+
+def recompute_rating_totals(providers, ratings, **changes):
+    """Rewrite ``rating_count``, ``rating_sum`` and ``stars`` from the ratings table.
+
+    ``providers`` and ``ratings`` are querysets (historical models work too,
+    so migrations can use this). Each provider's totals come from one
+    GROUP BY subquery of the same UPDATE statement; ``changes`` are extra
+    columns for it. Returns the number of providers updated.
+    """
+    totals = ratings.filter(provider=OuterRef('pk')).order_by().values('provider')
+    decimal = DecimalField(max_digits=12, decimal_places=2)
+    return providers.update(
+        rating_count=Coalesce(Subquery(totals.annotate(n=Count('pk')).values('n')), 0),
+        rating_sum=Coalesce(Subquery(totals.annotate(s=Sum('score')).values('s')), Value(Decimal('0.00')), output_field=decimal),
+        stars=Coalesce(Subquery(totals.annotate(a=Round(Avg('score'), 2)).values('a')), Value(Decimal('0.00')), output_field=decimal),
+        **changes,
+    )
@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from .models import Provider
-from services.serializers import ServiceTypeSerializer
-from services.models import ServiceType
+from services.serializers import CatalogServiceTypeField, ServiceTypeSerializer
+from users.serializers import PublicUserSerializer
 
 
 class ProviderSerializer(serializers.ModelSerializer):
@@ -10,9 +10,12 @@ class ProviderSerializer(serializers.ModelSerializer):
     user_address = serializers.CharField(source='user.address', read_only=True)
     provider_image = serializers.ImageField(source='image', required=False, allow_null=True)
     service_types = ServiceTypeSerializer(many=True, read_only=True)
-    service_types_ids = serializers.PrimaryKeyRelatedField(queryset=ServiceType.objects.all(), many=True, required=False)
+    service_types_ids = CatalogServiceTypeField(many=True, required=False)
     stars = serializers.DecimalField(max_digits=3, decimal_places=2, read_only=True)
 
+    # nested serializers for ?expand= (app.sparse)
+    expandable_fields = {'user': PublicUserSerializer}
+
     class Meta:
         model = Provider
         fields = ['id', 'user', 'nickname', 'user_phone', 'user_address', 'provider_image', 'description', 'stars', 'cpf_cnpj', 'is_active', 'service_types', 'service_types_ids']
@@ -35,7 +38,7 @@ class ProviderSerializer(serializers.ModelSerializer):
 class ProviderApplicationSerializer(serializers.ModelSerializer):
     applicant = serializers.StringRelatedField(read_only=True)
     service_types = ServiceTypeSerializer(many=True, read_only=True) 
-    service_types_ids = serializers.PrimaryKeyRelatedField(queryset=ServiceType.objects.all(), many=True, required=False)
+    service_types_ids = CatalogServiceTypeField(many=True, required=False)
 
     class Meta:
         model = getattr(__import__('providers.models', fromlist=['ProviderApplication']), 'ProviderApplication')
@@ -47,4 +50,10 @@ class ProviderApplicationSerializer(serializers.ModelSerializer):
         instance = super().create(validated_data)
         if service_types:
             instance.service_types.set(service_types)
-        return instance
\ No newline at end of file
+        return instance
+
+
+class BulkApproveSerializer(serializers.Serializer):
+    MAX_IDS = 1000
+
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=MAX_IDS)
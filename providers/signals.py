@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.db.models.functions import Now
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from app.projection import projection_for_serializer
+from .cache import invalidate_provider_list
+from .models import Provider, ProviderApplication
+from .serializers import ProviderSerializer
+
+
+def _user_fields():
+    """User columns the provider payload reads, ``?expand=user`` included (None: unknown)."""
+    fields = set()
+    for serializer_class, prefix in ((ProviderSerializer, 'user__'), (ProviderSerializer.expandable_fields['user'], '')):
+        projection = projection_for_serializer(serializer_class)
+        if projection is None:
+            return None
+        fields.update(column[len(prefix):] for column in projection.columns if column.startswith(prefix))
+    fields.discard('pk')
+    return fields
+
+
+# user columns shown in the provider payload
+USER_FIELDS = _user_fields()
+
+
+@receiver(post_save, sender=get_user_model())
+def user_changed(sender, instance, created, update_fields, **kwargs):
+    if created:
+        return
+    if update_fields is not None and USER_FIELDS is not None and not USER_FIELDS & set(update_fields):
+        return
+    if Provider.objects.filter(user_id=instance.pk).update(updated_at=Now()):
+        invalidate_provider_list()
+
+
+@receiver([post_save, post_delete], sender=Provider)
+@receiver([post_save, post_delete], sender='servicerequests.Rating')
+@receiver([post_save, post_delete], sender='services.ServiceType')
+def listing_changed(sender, **kwargs):
+    # providers, their stars (ratings) and service type names
+    invalidate_provider_list()
+
+
+@receiver(m2m_changed, sender=Provider.service_types.through)
+@receiver(m2m_changed, sender=ProviderApplication.service_types.through)
+def service_types_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        type(instance).objects.filter(pk=instance.pk).update(updated_at=Now())
+    elif pk_set:
+        model.objects.filter(pk__in=pk_set).update(updated_at=Now())
+    if sender is Provider.service_types.through:
+        invalidate_provider_list()
@@ -2,16 +2,60 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from .models import Provider, ProviderApplication
-from .serializers import ProviderSerializer, ProviderApplicationSerializer
+from .serializers import ProviderSerializer, ProviderApplicationSerializer, BulkApproveSerializer
 from app.permissions import IsOwnerOrReadOnly, IsOwnerOnly
+from app.actor import get_actor
+from app.conditional import ConditionalGetMixin
+from app.prefetch import PrefetchMixin, prefetch_for_serializer
+from app.projection import ProjectionMixin, paginated_response
+from app.sparse import SparseFieldsetMixin, sparse_serializer_class
+from .pagination import ProviderPagination, ReviewQueuePagination
+from .filters import ProviderFilterBackend, parse_bool
+from services.catalog import get_catalog
+from . import approvals, cache as list_cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
-from django.db import IntegrityError
+from rest_framework.pagination import _positive_int
+from app.search import SearchPagination
+from app import geo
 
-class ProviderViewSet(viewsets.ModelViewSet):
+class ProviderViewSet(ConditionalGetMixin, SparseFieldsetMixin, ProjectionMixin, PrefetchMixin, viewsets.ModelViewSet):
     queryset = Provider.objects.all()
     serializer_class = ProviderSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    pagination_class = ProviderPagination
+    filter_backends = [ProviderFilterBackend]
+
+    def get_version_salt(self):
+        # service type names are part of the payload
+        return get_catalog().etag
+
+    def list(self, request, *args, **kwargs):
+        # anonymous and non-provider users all see the same listing, served
+        # from the response cache (JSON only: the browsable API is per user)
+        self.list_cache_key = None
+        if not get_actor(request).is_provider and request.accepted_renderer.format == 'json':
+            key = list_cache.cache_key(request)
+            cached = list_cache.get_page(key)
+            if cached is not None:
+                content, content_type, etag = cached
+                response = get_conditional_response(request._request, etag=etag) if etag else None
+                if response is None:
+                    response = HttpResponse(content, content_type=content_type)
+                if etag:
+                    response['ETag'] = etag
+                return response
+            self.list_cache_key = key
+        return super().list(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, 'list_cache_key', None)
+        if key is not None and response.status_code == 200 and isinstance(response, Response):
+            list_cache.set_page(key, response.render())
+        return response
 
     def get_permissions(self):
         if self.action == 'create':
@@ -29,13 +73,13 @@ class ProviderViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
     def get_queryset(self):
-        user = self.request.user
-        if user.is_authenticated and user.is_staff:
+        actor = get_actor(self.request)
+        if actor.is_staff:
             return Provider.objects.all()
-        if user.is_authenticated:
+        if actor.is_authenticated:
             # Se o usuário for provider, retorna só o próprio provider
-            if hasattr(user, 'provider_profile'):
-                return Provider.objects.filter(user=user)
+            if actor.is_provider:
+                return Provider.objects.filter(pk=actor.provider_id)
             # Se não for provider nem admin, retorna todos (apenas leitura)
             return Provider.objects.all()
         # Usuário não autenticado: retorna todos (apenas leitura)
@@ -47,19 +91,69 @@ class ProviderViewSet(viewsets.ModelViewSet):
         """List all service requests assigned to this provider."""
         from servicerequests.models import ServiceRequest
         from servicerequests.serializers import ServiceRequestDetailSerializer
+        from servicerequests.pagination import ServiceRequestPagination
         provider = self.get_object()
-        requests = ServiceRequest.objects.filter(provider=provider)
-        page = self.paginate_queryset(requests)
-        if page is not None:
-            serializer = ServiceRequestDetailSerializer(page, many=True, context={'request': request})
-            return self.get_paginated_response(serializer.data)
-        serializer = ServiceRequestDetailSerializer(requests, many=True, context={'request': request})
-        return Response(serializer.data)
+        serializer_class = sparse_serializer_class(ServiceRequestDetailSerializer, request)
+        return paginated_response(
+            ServiceRequest.objects.filter(provider=provider), serializer_class, ServiceRequestPagination(), request, self,
+        )
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Providers whose nickname or description match ``?q=``, best match first.
+
+        The listing filters (``service_type``, ``is_active``, ``min_stars``)
+        apply; keyset-paginated on the rank.
+        """
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            raise ValidationError({'q': 'Enter the words to search for.'})
+        queryset = Provider.search_index.search(self.filter_queryset(self.get_queryset()), text)
+        serializer_class = sparse_serializer_class(ProviderSerializer, request)
+        return paginated_response(queryset, serializer_class, SearchPagination(), request, self)
+
+    @action(detail=False, methods=['get'])
+    def nearest(self, request):
+        """Active providers nearest to ``?lat=&lon=`` (or to the user's own location).
+
+        Query params: ``service_type`` -- only providers offering it;
+        ``km`` -- search radius (default 50, at most 500); ``limit`` -- how
+        many (default 10, at most 50). Each result has the provider and its
+        ``distance_km``.
+        """
+        actor = get_actor(request)
+        latitude, longitude = geo.origin(request, request.user)
+        km = geo.radius(request, default=50, cutoff=500)
+        errors = {}
+        try:
+            limit = _positive_int(request.query_params.get('limit', 10), strict=True, cutoff=50)
+        except ValueError:
+            errors['limit'] = 'Use a positive integer.'
+        service_type_id = request.query_params.get('service_type')
+        if service_type_id is not None:
+            try:
+                service_type_id = _positive_int(service_type_id, strict=True)
+            except ValueError:
+                errors['service_type'] = 'Use a service type id.'
+        if errors:
+            raise ValidationError(errors)
+
+        found = Provider.nearest(latitude, longitude, limit, km, service_type_id=service_type_id, exclude_user_id=actor.user_id)
+        serializer_class = sparse_serializer_class(ProviderSerializer, request)
+        queryset = prefetch_for_serializer(Provider.objects.filter(pk__in=[pk for _, pk in found]), serializer_class)
+        providers = {provider.pk: provider for provider in queryset}
+        context = self.get_serializer_context()
+        results = [
+            {'provider': serializer_class(providers[pk], context=context).data, 'distance_km': round(distance, 3)}
+            for distance, pk in found
+            if pk in providers
+        ]
+        return Response({'results': results}, status=status.HTTP_200_OK)
 
     def perform_create(self, serializer):
         # Prevent creating a second Provider for the same user (OneToOneField)
         user = getattr(self.request, 'user', None)
-        if user is not None and hasattr(user, 'provider_profile'):
+        if get_actor(self.request).is_provider:
             raise ValidationError({'detail': 'User already has a provider profile.'})
         serializer.save(user=user)
 
@@ -86,66 +180,77 @@ class ProviderViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'Provide "is_active" boolean in body.'}, status=status.HTTP_400_BAD_REQUEST)
 
         # parse boolean-like values
-        if isinstance(val, bool):
-            is_active = val
-        else:
-            sval = str(val).strip().lower()
-            if sval in ('1', 'true', 'yes', 'on'):
-                is_active = True
-            elif sval in ('0', 'false', 'no', 'off'):
-                is_active = False
-            else:
-                return Response({'detail': 'Invalid value for is_active; use true/false.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            is_active = val if isinstance(val, bool) else parse_bool(val)
+        except ValueError:
+            return Response({'detail': 'Invalid value for is_active; use true/false.'}, status=status.HTTP_400_BAD_REQUEST)
 
         provider.is_active = is_active
         provider.save()
         return Response(ProviderSerializer(provider, context={'request': request}).data, status=status.HTTP_200_OK)
 
 
-class ProviderApplicationViewSet(viewsets.ModelViewSet):
+class ProviderApplicationViewSet(ConditionalGetMixin, ProjectionMixin, PrefetchMixin, viewsets.ModelViewSet):
     """Admin viewset to review provider applications.
 
     Endpoints:
     - list/retrieve: admins only
     - POST /{id}/approve/: create Provider from application
+    - GET /review-queue/: pending applications, oldest first
+    - POST /bulk-approve/: approve many applications at once
     - POST /{id}/reject/: mark application rejected
     """
     queryset = ProviderApplication.objects.all()
     serializer_class = ProviderApplicationSerializer
     permission_classes = [permissions.IsAdminUser]
 
+    def get_version_salt(self):
+        return get_catalog().etag
+
+    @action(detail=False, methods=['get'], url_path='review-queue', permission_classes=[permissions.IsAdminUser])
+    def review_queue(self, request):
+        """Pending applications, oldest first, paginated by cursor.
+
+        Served from the partial index on pending applications and rendered
+        from ``.values()`` rows: one query for the page plus one for the
+        service types, however deep the page.
+        """
+        queryset = ProviderApplication.objects.filter(status=ProviderApplication.STATUS_PENDING)
+        return paginated_response(queryset, ProviderApplicationSerializer, ReviewQueuePagination(), request, self)
+
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAdminUser])
     def approve(self, request, pk=None):
         app = self.get_object()
-        if app.status != app.STATUS_PENDING:
-            return Response({'detail': 'Application already reviewed.'}, status=status.HTTP_400_BAD_REQUEST)
+        providers, errors = approvals.approve_many([app.pk], request.user)
+        if app.pk in errors:
+            error = errors[app.pk]
+            return Response({'detail': error.detail}, status=error.status_code)
+        provider = prefetch_for_serializer(Provider.objects.all(), ProviderSerializer).get(pk=providers[app.pk])
+        return Response(ProviderSerializer(provider, context={'request': request}).data, status=status.HTTP_201_CREATED)
 
-        if hasattr(app.applicant, 'provider_profile'):
-            return Response({'detail': 'Applicant already has a provider profile.'}, status=status.HTTP_400_BAD_REQUEST)
+    @action(detail=False, methods=['post'], url_path='bulk-approve', permission_classes=[permissions.IsAdminUser])
+    def bulk_approve(self, request):
+        """Approve up to 1000 applications at once.
 
-        try:
-            provider = Provider.objects.create(
-                user=app.applicant,
-                nickname=app.nickname,
-                description=app.description,
-                cpf_cnpj=app.cpf_cnpj,
-            )
-        except IntegrityError:
-            return Response({'detail': 'Could not create provider — a provider for this user may already exist.'}, status=status.HTTP_400_BAD_REQUEST)
-        if app.service_types.exists():
-            provider.service_types.set(app.service_types.all())
-
-        app.status = app.STATUS_APPROVED
-        app.reviewer = request.user
-        app.reviewed_at = timezone.now()
-        app.save()
+        Body: ``{"ids": [1, 2, 3]}``. The same rules as ``approve`` apply to
+        each application; all the approvals that pass them are made in one
+        transaction. Responds 200 with one result per id, in the order given:
+        ``{"id", "ok": true, "provider_id"}`` or
+        ``{"id", "ok": false, "status_code", "detail"}``.
+        """
+        serializer = BulkApproveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
 
-        # mark the applicant user as provider
-        applicant_user = app.applicant
-        applicant_user.is_provider = True
-        applicant_user.save()
-
-        return Response(ProviderSerializer(provider, context={'request': request}).data, status=status.HTTP_201_CREATED)
+        providers, errors = approvals.approve_many(ids, request.user)
+        results = []
+        for pk in ids:
+            error = errors.get(pk)
+            if error is None:
+                results.append({'id': pk, 'ok': True, 'provider_id': providers[pk]})
+            else:
+                results.append({'id': pk, 'ok': False, 'status_code': error.status_code, 'detail': error.detail})
+        return Response({'results': results}, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAdminUser])
     def reject(self, request, pk=None):
@@ -0,0 +1,100 @@
+"""In-process publish/subscribe for the provider job stream.
+
+Views publish job events; the streaming endpoint subscribes once per
+connected provider, filtered by the provider's service types. The backend is
+chosen by the ``SERVICE_REQUEST_BROKER`` setting (an import path) so that a
+shared backend (Redis pub/sub, PostgreSQL LISTEN/NOTIFY, ...) can replace
+``InMemoryBroker``, which only reaches subscribers in the same process.
+"""
+import asyncio
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Broker:
+    """Interface of a broker backend.
+
+    ``publish`` is called from synchronous code (views, ``on_commit``
+    callbacks); ``subscribe`` from the event loop serving the stream.
+    """
+
+    def publish(self, service_type_id, event):
+        raise NotImplementedError
+
+    def subscribe(self, service_type_ids):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class Subscription:
+    """Events for one connected provider, read with ``await get()``.
+
+    Events are queued on the subscriber's event loop. When a slow client lets
+    ``maxsize`` events pile up, newer events are dropped and ``overflowed`` is
+    set, so the stream can tell the client to refetch the list.
+    """
+
+    def __init__(self, broker, service_type_ids, maxsize=100):
+        self.broker = broker
+        self.service_type_ids = frozenset(service_type_ids)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def deliver(self, event):
+        # runs on the subscriber's loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InMemoryBroker(Broker):
+    """Fan-out to the subscribers of this process, indexed by service type."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, service_type_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(service_type_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # the subscriber's loop is closed
+                subscription.close()
+
+    def subscribe(self, service_type_ids):
+        subscription = Subscription(self, service_type_ids)
+        with self._lock:
+            for service_type_id in subscription.service_type_ids:
+                self._subscribers.setdefault(service_type_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for service_type_id in subscription.service_type_ids:
+                subscribers = self._subscribers.get(service_type_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[service_type_id]
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    backend = getattr(settings, 'SERVICE_REQUEST_BROKER', 'servicerequests.broker.InMemoryBroker')
+    return import_string(backend)()
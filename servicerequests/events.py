@@ -0,0 +1,33 @@
+"""Job events pushed to connected providers through the broker."""
+from django.db import transaction
+from .broker import get_broker
+from .models import ServiceRequest
+
+JOB_FIELDS = ('id', 'title', 'address', 'requested_date', 'service_type_id', 'service_type__name')
+
+
+def publish_open_jobs(pks):
+    """Announce the service requests in ``pks`` as open jobs after commit.
+
+    Called when requests are created or reopened. Rows that are no longer
+    open by the time the transaction commits are skipped.
+    """
+    pks = list(pks)
+    if pks:
+        transaction.on_commit(lambda: _publish(pks))
+
+
+def _publish(pks):
+    broker = get_broker()
+    rows = ServiceRequest.objects.filter(
+        pk__in=pks, status=ServiceRequest.STATUS_PENDING, provider__isnull=True,
+    ).values(*JOB_FIELDS)
+    for row in rows:
+        broker.publish(row['service_type_id'], {
+            'id': row['id'],
+            'title': row['title'],
+            'address': row['address'],
+            'requested_date': row['requested_date'],
+            'service_type_id': row['service_type_id'],
+            'service_type': row['service_type__name'],
+        })
@@ -0,0 +1,124 @@
+"""Streaming export of service requests with their rating, provider and service type.
+
+``export_rows`` reads the rows with one joined ``.values()`` query through
+``iterator(chunk_size=...)`` (a server-side cursor on PostgreSQL), and
+``render`` turns them into NDJSON or CSV lines one at a time, so memory
+does not grow with the table. Rows come ordered by ``updated_at`` (then
+id); ``since`` keeps the rows changed at or after that moment, which a
+rating also counts as, so an incremental job passes the newest
+``updated_at`` it has seen and upserts by id.
+"""
+import csv
+import datetime
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.utils.encoders import JSONEncoder
+
+from app.renderers import ORJSONRenderer
+from .models import ServiceRequest
+
+# output column -> values() path
+COLUMNS = {
+    'id': 'id',
+    'title': 'title',
+    'status': 'status',
+    'requested_date': 'requested_date',
+    'completion_date': 'completion_date',
+    'updated_at': 'updated_at',
+    'client_id': 'client_id',
+    'service_type_id': 'service_type_id',
+    'service_type': 'service_type__name',
+    'provider_id': 'provider_id',
+    'provider': 'provider__nickname',
+    'provider_stars': 'provider__stars',
+    'rating_score': 'rating__score',
+    'rating_comment': 'rating__comment',
+    'rating_created_at': 'rating__created_at',
+}
+
+OUTPUTS = ('ndjson', 'csv')
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+DEFAULT_CHUNK_SIZE = 2000
+# bytes per write of a streamed HTTP response
+WRITE_SIZE = 64 * 1024
+
+
+def parse_since(value):
+    """An ISO 8601 date or datetime as an aware datetime; ValueError if it is neither."""
+    since = parse_datetime(value)
+    if since is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        since = datetime.datetime.combine(day, datetime.time.min)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def export_rows(since=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Iterator of ``{column: value}`` dicts, oldest change first."""
+    queryset = ServiceRequest.objects.all()
+    if since is not None:
+        queryset = queryset.filter(updated_at__gte=since)
+    rows = (
+        queryset
+        .order_by('updated_at', 'id')
+        .values_list(*COLUMNS.values())
+        .iterator(chunk_size=chunk_size)
+    )
+    names = tuple(COLUMNS)
+    for row in rows:
+        yield dict(zip(names, row))
+
+
+def ndjson_lines(rows):
+    renderer = ORJSONRenderer()
+    for row in rows:
+        yield renderer.render(row) + b'\n'
+
+
+class _Echo:
+    """File-like object handing back what ``csv.writer`` writes."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value, encoder=JSONEncoder()):
+    if value is None:
+        return ''
+    if isinstance(value, datetime.datetime):
+        # same text as the JSON output
+        return encoder.default(value)
+    return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row.values()])
+
+
+def render(rows, output):
+    """Lines of ``rows`` in ``output`` format (``'ndjson'`` bytes or ``'csv'`` text)."""
+    if output == 'csv':
+        return csv_lines(rows)
+    return ndjson_lines(rows)
+
+
+def buffered(lines, size=WRITE_SIZE):
+    """``lines`` joined into pieces of about ``size``, so a response is not written line by line."""
+    pending = []
+    length = 0
+    for line in lines:
+        pending.append(line)
+        length += len(line)
+        if length >= size:
+            yield pending[0][:0].join(pending)
+            pending = []
+            length = 0
+    if pending:
+        yield pending[0][:0].join(pending)
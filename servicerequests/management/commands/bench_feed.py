@@ -0,0 +1,109 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Q
+from providers.models import Provider
+from services.models import ServiceType
+from servicerequests.models import ServiceRequest
+import random
+import statistics
+import time
+
+User = get_user_model()
+
+
+def legacy_feed(provider):
+    """The provider feed as it was built before ``provider_feed`` (OR + DISTINCT)."""
+    return ServiceRequest.objects.filter(
+        Q(service_type__in=provider.service_types.all(), status=ServiceRequest.STATUS_PENDING) |
+        Q(provider=provider)
+    ).distinct().order_by('-requested_date', '-id')
+
+
+def new_feed(provider, limit):
+    service_type_ids = provider.service_types.values_list('pk', flat=True)
+    return ServiceRequest.objects.provider_feed(provider.pk, service_type_ids, limit=limit)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the provider job feed page query (legacy OR + DISTINCT vs indexed branches)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1_000_000, help='Number of service requests to generate (default: 1000000)')
+        parser.add_argument('--service-types', type=int, default=20, help='Number of service types (default: 20)')
+        parser.add_argument('--providers', type=int, default=200, help='Number of providers receiving assigned jobs (default: 200)')
+        parser.add_argument('--page-size', type=int, default=20, help='Rows fetched per feed page (default: 20)')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query (default: 20)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='bulk_create batch size (default: 5000)')
+
+    def handle(self, *args, **options):
+        # Everything runs inside a transaction that is rolled back at the end,
+        # so the benchmark never leaves data behind.
+        with transaction.atomic():
+            provider = self._seed(options)
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            self._run(provider, options)
+            transaction.set_rollback(True)
+
+    def _seed(self, options):
+        rng = random.Random(42)
+        service_types = [ServiceType.objects.create(name=f'bench-{i}') for i in range(options['service_types'])]
+        client = User.objects.create_user(username='bench-feed-client', email='bench-feed-client@example.com')
+
+        providers = []
+        for i in range(options['providers']):
+            user = User.objects.create_user(username=f'bench-feed-provider-{i}', email=f'bench-feed-provider-{i}@example.com')
+            provider = Provider.objects.create(user=user, cpf_cnpj=f'bench-{i}', is_active=True)
+            provider.service_types.set(rng.sample(service_types, k=min(2, len(service_types))))
+            providers.append(provider)
+
+        total = options['requests']
+        batch_size = options['batch_size']
+        statuses = [ServiceRequest.STATUS_PENDING, ServiceRequest.STATUS_IN_PROGRESS, ServiceRequest.STATUS_COMPLETED, ServiceRequest.STATUS_CANCELLED]
+        self.stdout.write(f'Generating {total} service requests...')
+        started = time.perf_counter()
+        for offset in range(0, total, batch_size):
+            batch = []
+            for _ in range(min(batch_size, total - offset)):
+                status = rng.choices(statuses, weights=[2, 1, 6, 1])[0]
+                batch.append(ServiceRequest(
+                    title='bench',
+                    description='bench',
+                    address='bench',
+                    client=client,
+                    service_type=rng.choice(service_types),
+                    provider=None if status == ServiceRequest.STATUS_PENDING else rng.choice(providers),
+                    status=status,
+                ))
+            ServiceRequest.objects.bulk_create(batch)
+        self.stdout.write(f'  done in {time.perf_counter() - started:.1f}s')
+        return providers[0]
+
+    def _time(self, fetch, options):
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            fetch()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def _run(self, provider, options):
+        page_size = options['page_size']
+
+        def fetch_legacy():
+            return list(legacy_feed(provider).values_list('pk', flat=True)[:page_size])
+
+        def fetch_new():
+            return list(new_feed(provider, page_size).values_list('pk', flat=True)[:page_size])
+
+        if fetch_legacy() != fetch_new():
+            self.stderr.write('Feeds differ: legacy and new queries returned different pages.')
+
+        for label, fetch in (('legacy (OR + DISTINCT)', fetch_legacy), ('provider_feed', fetch_new)):
+            timings = self._time(fetch, options)
+            self.stdout.write(
+                f'{label:28} median {statistics.median(timings):8.2f} ms  '
+                f'p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:8.2f} ms'
+            )
@@ -0,0 +1,103 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from app import geo
+from providers.models import Provider
+from services.models import ServiceType
+from servicerequests.models import ServiceRequest
+import math
+import random
+import statistics
+import time
+
+User = get_user_model()
+
+# around São Paulo
+CENTER = (-23.5505, -46.6333)
+SPREAD_KM = 40
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the geohash searches: open jobs within N km and nearest active providers, against a full scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000, help='Providers and open requests to generate (default: 50000)')
+        parser.add_argument('--runs', type=int, default=50, help='Searches timed per case (default: 50)')
+        parser.add_argument('--explain', action='store_true', help='Print the query plans')
+
+    def handle(self, *args, **options):
+        # Everything runs inside a transaction that is rolled back at the end,
+        # so the benchmark never leaves data behind.
+        with transaction.atomic():
+            service_type = self._seed(options['rows'])
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            rng = random.Random(7)
+            points = [self._point(rng, SPREAD_KM / 2) for _ in range(options['runs'])]
+
+            for km in (2, 10, 30):
+                self._time(f'open jobs within {km} km', points, lambda lat, lon: ServiceRequest.objects.open_near(lat, lon, km, [service_type], 20))
+            for k in (10, 50):
+                self._time(f'{k} nearest active providers', points, lambda lat, lon: Provider.nearest(lat, lon, k, 100))
+            self._time('open jobs within 10 km, full scan', points[:5], lambda lat, lon: geo.within(
+                ServiceRequest.objects.filter(status=ServiceRequest.STATUS_PENDING).values_list('pk', 'latitude', 'longitude'),
+                lat, lon, 10,
+            )[:20])
+
+            if options['explain']:
+                lat, lon = CENTER
+                self.stdout.write(ServiceRequest.objects.filter(
+                    geo.cover_q('geohash', lat, lon, 10), status=ServiceRequest.STATUS_PENDING,
+                ).values_list('pk', 'latitude', 'longitude').explain())
+                self.stdout.write(Provider.objects.filter(
+                    geo.cover_q('user__geohash', lat, lon, 10), is_active=True,
+                ).values_list('pk', 'user__latitude', 'user__longitude').explain())
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _point(rng, km):
+        d_lat = km / geo.KM_PER_DEGREE
+        d_lon = d_lat / math.cos(math.radians(CENTER[0]))
+        return CENTER[0] + rng.uniform(-d_lat, d_lat), CENTER[1] + rng.uniform(-d_lon, d_lon)
+
+    def _seed(self, count):
+        self.stdout.write(f'Generating {count} located providers and {count} open requests...')
+        rng = random.Random(42)
+        service_type = ServiceType.objects.create(name='bench-geo')
+        users = []
+        for i in range(count + 1):
+            lat, lon = self._point(rng, SPREAD_KM)
+            users.append(User(
+                username=f'bench-geo-{i}', email=f'bench-geo-{i}@example.com',
+                latitude=lat, longitude=lon, geohash=geo.encode(lat, lon),
+            ))
+        User.objects.bulk_create(users, batch_size=5000)
+        users = list(User.objects.filter(username__startswith='bench-geo-').order_by('pk').values_list('pk', flat=True))
+        client, users = users[0], users[1:]
+        Provider.objects.bulk_create([
+            Provider(user_id=user_id, cpf_cnpj=f'bench-geo-{i}', is_active=rng.random() < 0.8)
+            for i, user_id in enumerate(users)
+        ], batch_size=5000)
+        requests = []
+        for i in range(count):
+            lat, lon = self._point(rng, SPREAD_KM)
+            requests.append(ServiceRequest(
+                title=f'bench-geo {i}', description='-', address='-', client_id=client, service_type=service_type,
+                latitude=lat, longitude=lon, geohash=geo.encode(lat, lon),
+                status=rng.choice((ServiceRequest.STATUS_PENDING, ServiceRequest.STATUS_COMPLETED)),
+            ))
+        ServiceRequest.objects.bulk_create(requests, batch_size=5000)
+        return service_type.pk
+
+    def _time(self, label, points, search):
+        timings = []
+        found = 0
+        for lat, lon in points:
+            started = time.perf_counter()
+            found += len(search(lat, lon))
+            timings.append(time.perf_counter() - started)
+        self.stdout.write(
+            f'{label}: median {statistics.median(timings) * 1000:.2f} ms, '
+            f'max {max(timings) * 1000:.2f} ms, {found / len(points):.1f} results'
+        )
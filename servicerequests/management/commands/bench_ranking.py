@@ -0,0 +1,107 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from decimal import Decimal
+from providers.models import Provider
+from services.models import ServiceType
+from servicerequests.matching import RankingIndex
+from servicerequests.models import ServiceRequest
+import random
+import statistics
+import time
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the provider ranking index: build time, top-K lookup latency and incremental updates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--providers', type=int, default=100000, help='Number of providers to generate (default: 100000)')
+        parser.add_argument('--service-types', type=int, default=20, help='Number of service types (default: 20)')
+        parser.add_argument('--lookups', type=int, default=10000, help='Number of top-K lookups to time (default: 10000)')
+        parser.add_argument('-k', type=int, default=10, help='Candidates per lookup (default: 10)')
+        parser.add_argument('--updates', type=int, default=200, help='Number of single-provider reloads to time (default: 200)')
+
+    def handle(self, *args, **options):
+        # Everything runs inside a transaction that is rolled back at the end,
+        # so the benchmark never leaves data behind.
+        with transaction.atomic():
+            service_types, providers = self._seed(options['providers'], options['service_types'])
+            rng = random.Random(7)
+
+            index = RankingIndex()
+            started = time.perf_counter()
+            index.rebuild(0)
+            self.stdout.write(f'Full build: {time.perf_counter() - started:.2f}s for {len(index.states)} providers')
+
+            timings = []
+            with CaptureQueriesContext(connection) as ctx:
+                for _ in range(options['lookups']):
+                    service_type = rng.choice(service_types)
+                    started = time.perf_counter()
+                    index.top(service_type, options['k'])
+                    timings.append(time.perf_counter() - started)
+            self._report(f'top-{options["k"]} lookup', timings)
+            self.stdout.write(f'  queries during lookups: {len(ctx.captured_queries)}')
+
+            timings = []
+            for provider_id in rng.sample(providers, min(options['updates'], len(providers))):
+                Provider.objects.filter(pk=provider_id).update(**Provider.rating_changes(1, Decimal('5.00')))
+                started = time.perf_counter()
+                index.reload([provider_id])
+                timings.append(time.perf_counter() - started)
+            self._report('single-provider reload (3 queries)', timings)
+
+            service_type = rng.choice(service_types)
+            started = time.perf_counter()
+            list(
+                Provider.objects.filter(is_active=True, service_types=service_type)
+                .order_by('-stars', '-id').values_list('pk', flat=True)[:options['k']]
+            )
+            self.stdout.write(f'For reference, SQL top-{options["k"]} by stars alone: {(time.perf_counter() - started) * 1000:.2f} ms')
+            transaction.set_rollback(True)
+
+    def _seed(self, count, service_type_count):
+        self.stdout.write(f'Generating {count} providers over {service_type_count} service types...')
+        rng = random.Random(42)
+        service_types = [ServiceType.objects.create(name=f'bench-ranking-{i}').pk for i in range(service_type_count)]
+        User.objects.bulk_create([
+            User(username=f'bench-ranking-{i}', email=f'bench-ranking-{i}@example.com') for i in range(count + 1)
+        ], batch_size=5000)
+        users = list(User.objects.filter(username__startswith='bench-ranking-').order_by('pk').values_list('pk', flat=True))
+        client, users = users[0], users[1:]
+        providers = []
+        for i, user_id in enumerate(users):
+            rating_count = rng.randrange(0, 40)
+            rating_sum = Decimal(sum(rng.randrange(250, 501) for _ in range(rating_count))) / 100
+            providers.append(Provider(
+                user_id=user_id, cpf_cnpj=f'bench-ranking-{i}', is_active=rng.random() < 0.8,
+                rating_count=rating_count, rating_sum=rating_sum,
+                stars=(rating_sum / rating_count).quantize(Decimal('0.01')) if rating_count else Decimal('0.00'),
+            ))
+        Provider.objects.bulk_create(providers, batch_size=5000)
+        providers = list(Provider.objects.filter(cpf_cnpj__startswith='bench-ranking-').values_list('pk', flat=True))
+        Provider.service_types.through.objects.bulk_create([
+            Provider.service_types.through(provider_id=provider_id, servicetype_id=service_type)
+            for provider_id in providers for service_type in rng.sample(service_types, rng.randint(1, 3))
+        ], batch_size=5000)
+        # workload and history for about half of them
+        ServiceRequest.objects.bulk_create([
+            ServiceRequest(
+                title=f'bench-ranking {i}', description='-', address='-', client_id=client,
+                service_type_id=rng.choice(service_types), provider_id=rng.choice(providers),
+                status=rng.choice((ServiceRequest.STATUS_IN_PROGRESS, ServiceRequest.STATUS_COMPLETED)),
+            )
+            for i in range(count // 2)
+        ], batch_size=5000)
+        return service_types, providers
+
+    def _report(self, label, timings):
+        timings = sorted(timings)
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(
+            f'{label}: median {statistics.median(timings) * 1e6:.1f} us, '
+            f'p99 {p99 * 1e6:.1f} us, max {timings[-1] * 1e6:.1f} us'
+        )
@@ -0,0 +1,130 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from app.parsers import ORJSONParser
+from app.prefetch import prefetch_for_serializer
+from app.renderers import ORJSONRenderer
+from providers.models import Provider
+from providers.serializers import ProviderSerializer
+from services.models import ServiceType
+from servicerequests.models import ServiceRequest, Rating
+from servicerequests.serializers import ServiceRequestDetailSerializer
+from decimal import Decimal
+import io
+import random
+import time
+import tracemalloc
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark JSON rendering and parsing of realistic list pages: DRF JSONRenderer/JSONParser vs the orjson pair'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000], help='Page sizes to render (default: 100 1000)')
+        parser.add_argument('--seconds', type=float, default=2.0, help='Time budget per measurement (default: 2)')
+
+    def handle(self, *args, **options):
+        rows = max(options['sizes'])
+        # Everything runs inside a transaction that is rolled back at the end,
+        # so the benchmark never leaves data behind.
+        with transaction.atomic():
+            self._seed(rows)
+            for size in options['sizes']:
+                requests = prefetch_for_serializer(
+                    ServiceRequest.objects.filter(title__startswith='bench-renderers'), ServiceRequestDetailSerializer,
+                ).order_by(*ServiceRequest.LIST_ORDERING)[:size]
+                providers = prefetch_for_serializer(
+                    Provider.objects.filter(cpf_cnpj__startswith='bench-renderers'), ProviderSerializer,
+                ).order_by('-stars', '-id')[:size]
+                self._run(f'ServiceRequestDetailSerializer x{size}', ServiceRequestDetailSerializer(requests, many=True).data, options)
+                self._run(f'ProviderSerializer x{size}', ProviderSerializer(providers, many=True).data, options)
+            transaction.set_rollback(True)
+
+    def _seed(self, rows):
+        self.stdout.write(f'Generating {rows} providers and {rows} service requests...')
+        rng = random.Random(42)
+        service_types = [ServiceType.objects.create(name=f'bench-renderers-{i}') for i in range(8)]
+        users = User.objects.bulk_create([
+            User(
+                username=f'bench-renderers-{i}', email=f'bench-renderers-{i}@example.com',
+                phone_number=f'+55 11 9{i:08d}', address=f'Rua das Flores, {i} - São Paulo',
+            )
+            for i in range(rows + 1)
+        ])
+        if users and users[0].pk is None:
+            users = list(User.objects.filter(username__startswith='bench-renderers-').order_by('pk'))
+        client, users = users[0], users[1:]
+        providers = Provider.objects.bulk_create([
+            Provider(
+                user=user, cpf_cnpj=f'bench-renderers-{i}', nickname=f'Prestador {i}', is_active=True,
+                description='Serviços de manutenção residencial e pequenos reparos. ' * 3,
+                stars=Decimal(rng.randrange(0, 501)) / 100,
+            )
+            for i, user in enumerate(users)
+        ])
+        if providers and providers[0].pk is None:
+            providers = list(Provider.objects.filter(cpf_cnpj__startswith='bench-renderers-').order_by('pk'))
+        Provider.service_types.through.objects.bulk_create([
+            Provider.service_types.through(provider_id=provider.pk, servicetype_id=service_type.pk)
+            for provider in providers for service_type in rng.sample(service_types, 3)
+        ])
+        now = timezone.now()
+        requests = ServiceRequest.objects.bulk_create([
+            ServiceRequest(
+                title=f'bench-renderers {i}', description='Trocar a resistência do chuveiro e revisar o disjuntor.',
+                address=f'Av. Paulista, {i}', client=client, service_type=rng.choice(service_types),
+                provider=providers[i % len(providers)], status=ServiceRequest.STATUS_COMPLETED, completion_date=now,
+            )
+            for i in range(rows)
+        ])
+        if requests and requests[0].pk is None:
+            requests = list(ServiceRequest.objects.filter(title__startswith='bench-renderers').order_by('pk'))
+        Rating.objects.bulk_create([
+            Rating(
+                service_request=request, provider_id=request.provider_id, reviewer=client,
+                score=Decimal(rng.randrange(0, 501)) / 100, comment='Ótimo atendimento, recomendo.',
+            )
+            for request in requests[::2]
+        ])
+
+    def _measure(self, fn, seconds):
+        fn()
+        runs = 0
+        started = time.perf_counter()
+        while True:
+            fn()
+            runs += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= seconds:
+                return runs / elapsed
+
+    def _allocations(self, fn):
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            fn()
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+        return blocks, peak
+
+    def _run(self, label, data, options):
+        expected = JSONRenderer().render(data)
+        body = ORJSONRenderer().render(data)
+        identical = 'identical' if body == expected else 'DIFFERENT'
+        self.stdout.write(f'{label} ({len(expected) / 1024:.0f} KiB, output {identical})')
+        for name, renderer, parser in (('DRF json', JSONRenderer(), JSONParser()), ('orjson', ORJSONRenderer(), ORJSONParser())):
+            render_rate = self._measure(lambda: renderer.render(data), options['seconds'])
+            parse_rate = self._measure(lambda: parser.parse(io.BytesIO(expected), 'application/json', {}), options['seconds'])
+            blocks, peak = self._allocations(lambda: renderer.render(data))
+            self.stdout.write(
+                f'  {name:9} render {render_rate:8.1f}/s  parse {parse_rate:8.1f}/s  '
+                f'render allocations {blocks:6d} blocks, peak {peak / 1024:7.0f} KiB'
+            )
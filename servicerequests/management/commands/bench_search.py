@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Q
+from app.search import SearchPagination
+from services.models import ServiceType
+from servicerequests.models import ServiceRequest
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+import random
+import statistics
+import time
+
+User = get_user_model()
+
+WORDS = (
+    'chuveiro tomada disjuntor fiação lâmpada interruptor pintura parede massa corrida azulejo '
+    'piso rejunte vazamento torneira encanamento esgoto caixa d\'água telhado calha goteira '
+    'portão fechadura janela vidro armário montagem móveis faxina limpeza jardim poda grama '
+    'ar-condicionado geladeira máquina de lavar fogão instalação conserto troca urgente orçamento'
+).split()
+SEARCHES = ('chuveiro', 'vazamento torneira', 'montagem armário', 'ar-condicionado instalação', 'telhado goteira urgente')
+
+
+class Command(BaseCommand):
+    help = 'Benchmark full-text search of service requests: first and deep pages, against a LIKE scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100000, help='Number of service requests to generate (default: 100000)')
+        parser.add_argument('--runs', type=int, default=5, help='Timed runs per search (default: 5)')
+        parser.add_argument('--explain', action='store_true', help='Print the query plan of a search')
+
+    def handle(self, *args, **options):
+        # Everything runs inside a transaction that is rolled back at the end,
+        # so the benchmark never leaves data behind.
+        with transaction.atomic():
+            self._seed(options['requests'])
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            host = next((h for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+            factory = APIRequestFactory(HTTP_HOST=host)
+
+            for text in SEARCHES:
+                first, deep, found = [], [], 0
+                for _ in range(options['runs']):
+                    paginator = SearchPagination()
+                    started = time.perf_counter()
+                    page = paginator.paginate_queryset(
+                        ServiceRequest.search_index.search(ServiceRequest.objects.all(), text).values('id', 'rank'),
+                        Request(factory.get('/')),
+                    )
+                    first.append(time.perf_counter() - started)
+                    found = len(page)
+                    if paginator.has_next:
+                        # the page after the 10th, as a client following next links gets it
+                        position = paginator.next_position
+                        for _ in range(10):
+                            request = Request(factory.get(paginator.encode_cursor(position)))
+                            paginator = SearchPagination()
+                            started = time.perf_counter()
+                            page = paginator.paginate_queryset(
+                                ServiceRequest.search_index.search(ServiceRequest.objects.all(), text).values('id', 'rank'),
+                                request,
+                            )
+                            elapsed = time.perf_counter() - started
+                            if not page:
+                                break
+                            position = paginator.next_position
+                        deep.append(elapsed)
+                line = f'{text!r}: first page {statistics.median(first) * 1000:.2f} ms ({found} rows)'
+                if deep:
+                    line += f', 11th page {statistics.median(deep) * 1000:.2f} ms'
+                self.stdout.write(line)
+
+            text = SEARCHES[1]
+            words = text.split()
+            started = time.perf_counter()
+            list(ServiceRequest.objects.filter(
+                Q(title__icontains=words[0]) | Q(description__icontains=words[0]),
+            ).filter(Q(title__icontains=words[1]) | Q(description__icontains=words[1])).values_list('pk', flat=True))
+            self.stdout.write(f'For reference, {text!r} as icontains scan: {(time.perf_counter() - started) * 1000:.2f} ms')
+
+            if options['explain']:
+                self.stdout.write(
+                    ServiceRequest.search_index.search(ServiceRequest.objects.all(), text)
+                    .order_by(*SearchPagination.ordering).values('pk')[:21].explain()
+                )
+            transaction.set_rollback(True)
+
+    def _seed(self, count):
+        self.stdout.write(f'Generating {count} service requests...')
+        rng = random.Random(42)
+        # made-up words around the keywords, so each keyword is in a few
+        # percent of the requests as in real text
+        filler = [''.join(rng.choice('abcdefghijlmnoprstuv') for _ in range(rng.randint(3, 9))) for _ in range(5000)]
+        service_type = ServiceType.objects.create(name='bench-search')
+        client = User.objects.create_user(username='bench-search', email='bench-search@example.com')
+        ServiceRequest.objects.bulk_create([
+            ServiceRequest(
+                title=' '.join((rng.choice(WORDS), rng.choice(filler), rng.choice(filler))).capitalize(),
+                description=' '.join(rng.choice(WORDS if rng.random() < 0.1 else filler) for _ in range(rng.randint(10, 40))),
+                address='-', client=client, service_type=service_type,
+            )
+            for _ in range(count)
+        ], batch_size=5000)
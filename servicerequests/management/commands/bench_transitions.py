@@ -0,0 +1,130 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection, connections, transaction, OperationalError
+from providers.models import Provider
+from services.models import ServiceType
+from servicerequests.models import ServiceRequest
+from servicerequests import transitions
+from rest_framework.exceptions import APIException
+from app.actor import Actor
+import random
+import threading
+import time
+
+User = get_user_model()
+
+
+def legacy_accept(pk, user):
+    """The accept flow as it was before the transition engine (lock, re-read, save)."""
+    service_request = ServiceRequest.objects.get(pk=pk)
+    provider = user.provider_profile
+    if service_request.status != ServiceRequest.STATUS_PENDING or service_request.provider_id is not None:
+        return False
+    if service_request.service_type not in provider.service_types.all():
+        return False
+    with transaction.atomic():
+        sr = ServiceRequest.objects.select_for_update().get(pk=pk)
+        if sr.status != ServiceRequest.STATUS_PENDING or sr.provider_id is not None:
+            return False
+        sr.provider = provider
+        sr.status = ServiceRequest.STATUS_IN_PROGRESS
+        sr.save(update_fields=['provider', 'status', 'completion_date'])
+    sr.refresh_from_db()
+    return True
+
+
+def engine_accept(pk, user):
+    try:
+        actor = user.actor
+        # the requests the viewset lets a provider see
+        visible = ServiceRequest.objects.provider_feed(actor.provider_id, actor.service_type_ids)
+        transitions.apply('accept', pk, actor, visible)
+    except APIException:
+        return False
+    return True
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent accepts on the same service requests (legacy locking flow vs guarded UPDATE)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--providers', type=int, default=16, help='Concurrent providers (threads) (default: 16)')
+        parser.add_argument('--requests', type=int, default=200, help='Pending requests to fight over per run (default: 200)')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated data')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite serializes writers; run against PostgreSQL for meaningful contention numbers.'))
+
+        service_type, client, users = self._seed(options)
+        try:
+            for label, accept in (('legacy (select_for_update)', legacy_accept), ('guarded UPDATE', engine_accept)):
+                self._run(label, accept, service_type, client, users, options)
+        finally:
+            if not options['keep']:
+                ServiceRequest.objects.filter(client=client).delete()
+                Provider.objects.filter(user__in=users).delete()
+                User.objects.filter(pk__in=[u.pk for u in users] + [client.pk]).delete()
+                service_type.delete()
+
+    def _seed(self, options):
+        service_type = ServiceType.objects.create(name='bench-transitions')
+        client = User.objects.create_user(username='bench-transitions-client', email='bench-transitions-client@example.com')
+        users = []
+        for i in range(options['providers']):
+            user = User.objects.create_user(username=f'bench-transitions-{i}', email=f'bench-transitions-{i}@example.com')
+            provider = Provider.objects.create(user=user, cpf_cnpj=f'bench-tr-{i}', is_active=True)
+            provider.service_types.set([service_type])
+            users.append(user)
+        return service_type, client, users
+
+    def _run(self, label, accept, service_type, client, users, options):
+        pks = [
+            sr.pk for sr in ServiceRequest.objects.bulk_create([
+                ServiceRequest(title='bench', description='bench', address='bench', client=client, service_type=service_type)
+                for _ in range(options['requests'])
+            ])
+        ]
+        if not pks or pks[0] is None:
+            pks = list(ServiceRequest.objects.filter(client=client, status=ServiceRequest.STATUS_PENDING).values_list('pk', flat=True))
+
+        counters = {'won': 0, 'lost': 0, 'errors': 0}
+        lock = threading.Lock()
+        start = threading.Barrier(len(users) + 1)
+
+        def worker(user):
+            # every provider tries every request, in its own random order
+            order = pks[:]
+            random.shuffle(order)
+            user = User.objects.select_related('provider_profile').get(pk=user.pk)
+            user.actor = Actor.for_user(user)
+            start.wait()
+            try:
+                for pk in order:
+                    try:
+                        won = accept(pk, user)
+                    except OperationalError:
+                        won = None
+                    with lock:
+                        counters['won' if won else 'lost' if won is False else 'errors'] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        attempts = sum(counters.values())
+        self.stdout.write(
+            f'{label:28} {attempts / elapsed:9.1f} attempts/s  {counters["won"] / elapsed:8.1f} accepts/s  '
+            f'won={counters["won"]} lost={counters["lost"]} errors={counters["errors"]} in {elapsed:.2f}s'
+        )
+        duplicates = counters['won'] - len(pks)
+        if duplicates > 0:
+            self.stderr.write(f'{duplicates} request(s) were accepted more than once!')
+        ServiceRequest.objects.filter(pk__in=pks).delete()
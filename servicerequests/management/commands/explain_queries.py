@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from rest_framework.test import APIRequestFactory, force_authenticate
+from providers.models import Provider
+import re
+
+User = get_user_model()
+
+# Plan lines that mean "read the whole table" on each backend. SQLite's
+# "SCAN <table> USING [COVERING] INDEX" is an ordered index walk and is not
+# reported; bare "SCAN <table>" is.
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)$'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Print EXPLAIN plans for the queries issued by the list endpoints, flagging sequential scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyze', action='store_true', help='Use EXPLAIN ANALYZE (PostgreSQL only)')
+        parser.add_argument('--fail-on-seq-scan', action='store_true', help='Exit with an error if any query scans a whole table')
+        parser.add_argument('--ignore-table', action='append', default=[], help='Table allowed to be scanned (repeatable), e.g. services_servicetype')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in SEQ_SCAN_PATTERNS:
+            raise CommandError(f'Unsupported database backend: {connection.vendor}')
+
+        staff = User.objects.filter(is_staff=True).first()
+        provider = Provider.objects.select_related('user').first()
+        client = User.objects.filter(is_staff=False, provider_profile__isnull=True, made_requests__isnull=False).first()
+
+        endpoints = [
+            ('anonymous', None, '/api/providers/'),
+            ('staff', staff, '/api/service-requests/'),
+            ('staff', staff, '/api/provider-applications/'),
+            ('staff', staff, '/api/provider-applications/review-queue/'),
+            ('provider', provider and provider.user, '/api/service-requests/'),
+            ('client', client, '/api/service-requests/'),
+            ('anonymous', None, '/api/providers/search/?q=eletricista'),
+            ('staff', staff, '/api/service-requests/search/?q=chuveiro'),
+            ('provider', provider and provider.user, '/api/service-requests/search/?q=chuveiro'),
+        ]
+        if staff and client:
+            endpoints.append(('staff', staff, f'/api/users/{client.pk}/service_requests/'))
+        if staff and provider:
+            endpoints.append(('staff', staff, f'/api/providers/{provider.pk}/service_requests/'))
+
+        host = next((h for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+        factory = APIRequestFactory(HTTP_HOST=host)
+        flagged = []
+        for role, user, path in endpoints:
+            if role != 'anonymous' and user is None:
+                self.stdout.write(self.style.WARNING(f'Skipping {path} as {role}: no such user in the database.'))
+                continue
+            flagged.extend(self._explain_endpoint(factory, role, user, path, options))
+
+        ignored = set(options['ignore_table'])
+        flagged = [(path, table) for path, table in flagged if table not in ignored]
+        if flagged:
+            for path, table in flagged:
+                self.stdout.write(self.style.ERROR(f'Sequential scan on {table} in {path}'))
+            if options['fail_on_seq_scan']:
+                raise CommandError(f'{len(flagged)} sequential scan(s) found.')
+        else:
+            self.stdout.write(self.style.SUCCESS('No sequential scans found.'))
+
+    def _explain_endpoint(self, factory, role, user, path, options):
+        request = factory.get(path)
+        if user is None:
+            request.user = AnonymousUser()
+        else:
+            force_authenticate(request, user=user)
+        match = resolve(request.path)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = match.func(request, *match.args, **match.kwargs)
+            response.render()
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{path} as {role} -> {response.status_code}, {len(ctx.captured_queries)} queries'))
+        flagged = []
+        for query in ctx.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            self.stdout.write(f'  {sql}')
+            for line in self._explain(sql, options):
+                self.stdout.write(f'    {line}')
+                scan = SEQ_SCAN_PATTERNS[connection.vendor].search(line)
+                if scan:
+                    flagged.append((path, scan.group(1)))
+        return flagged
+
+    def _explain(self, sql, options):
+        if connection.vendor == 'sqlite':
+            prefix = 'EXPLAIN QUERY PLAN '
+        else:
+            prefix = 'EXPLAIN ANALYZE ' if options['analyze'] else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            rows = cursor.fetchall()
+        if connection.vendor == 'sqlite':
+            return [row[-1] for row in rows]
+        return [row[0] for row in rows]
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from servicerequests import export
+
+
+class Command(BaseCommand):
+    help = 'Stream all service requests, with rating, provider and service type, as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', choices=export.OUTPUTS, default='ndjson', help='Output format (default: ndjson)')
+        parser.add_argument('--since', help='Only rows changed at or after this ISO 8601 date or datetime')
+        parser.add_argument('--chunk-size', type=int, default=export.DEFAULT_CHUNK_SIZE, help=f'Rows fetched per round trip (default: {export.DEFAULT_CHUNK_SIZE})')
+        parser.add_argument('--file', help='Write to this file instead of standard output')
+
+    def handle(self, *args, **options):
+        since = options['since']
+        if since is not None:
+            try:
+                since = export.parse_since(since)
+            except ValueError:
+                raise CommandError(f'Invalid --since: {since!r}; use an ISO 8601 date or datetime.')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive.')
+
+        lines = export.render(export.export_rows(since, options['chunk_size']), options['output'])
+        if options['file']:
+            with open(options['file'], 'w', encoding='utf-8', newline='') as out:
+                self._write(lines, out.write)
+        else:
+            self._write(lines, lambda line: self.stdout.write(line, ending=''))
+
+    def _write(self, lines, write):
+        for line in lines:
+            # NDJSON lines are bytes
+            write(line.decode('utf-8') if isinstance(line, bytes) else line)
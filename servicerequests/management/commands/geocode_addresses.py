@@ -0,0 +1,54 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from app import geo
+from servicerequests.models import ServiceRequest
+from users.authentication import invalidate_users
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Fill latitude/longitude of users and service requests from their addresses with the configured geocoder'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Geocode rows that already have coordinates too')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows read and written per round trip (default: 500)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        geocoder = geo.get_geocoder()
+        # addresses repeat (a client's requests, a building's users)
+        points = {}
+
+        def locate(address):
+            if address not in points:
+                points[address] = geocoder.geocode(address)
+            return points[address]
+
+        for model in (User, ServiceRequest):
+            rows = model.objects.exclude(address__isnull=True).exclude(address='')
+            if not options['all']:
+                rows = rows.filter(latitude__isnull=True)
+            located = 0
+            last = 0
+            while True:
+                batch = list(rows.filter(pk__gt=last).order_by('pk').only('pk', 'address', 'latitude', 'longitude', 'geohash')[:options['batch_size']])
+                if not batch:
+                    break
+                last = batch[-1].pk
+                changed = []
+                for obj in batch:
+                    point = locate(obj.address)
+                    if point is None:
+                        continue
+                    obj.latitude, obj.longitude = point
+                    obj.geohash = geo.encode(*point)
+                    changed.append(obj)
+                model.objects.bulk_update(changed, ['latitude', 'longitude', 'geohash'])
+                if model is User:
+                    # bulk_update sends no signals
+                    invalidate_users([obj.pk for obj in changed])
+                located += len(changed)
+            self.stdout.write(f'{model._meta.verbose_name_plural}: located {located}')
+        self.stdout.write(self.style.SUCCESS('Done.'))
@@ -0,0 +1,380 @@
+"""Ranking of candidate providers for a service request.
+
+Each process keeps a ``RankingIndex``: the scoring inputs of every
+provider (rating totals, active flag, IN_PROGRESS and COMPLETED request
+counts, offered service types) and, per service type, the active
+providers as a list sorted by score. ``top_candidates`` reads the first
+entries of one list, so a lookup costs the same with 100 or 100,000
+providers and never queries ``Provider``.
+
+The index is kept current incrementally. Whatever changes a provider's
+inputs (provider, rating and request saves through ``signals``, state
+transitions, bulk approvals) calls ``providers_changed`` with the
+provider ids; after the commit those ids are appended to a short journal
+in the Django cache. Before a lookup every process replays the entries it
+has not seen yet, reloading just those providers from the database. A
+journal it cannot follow (entries expired or lost with the cache) makes
+it rebuild the whole index instead. With a local-memory cache the journal
+is per process, like the broker's default backend; a shared cache
+(Redis, memcached) carries the changes to every process. Either way an
+index is rebuilt once it is ``SERVICE_REQUEST_RANKING_MAX_AGE`` seconds
+old, which bounds how long it can miss changes made in other processes.
+
+Full builds (about a second per 100,000 providers) run in a background
+thread, never in a request: ``warm_up`` starts the first one when a
+serving process starts (``app.wsgi``/``app.asgi``); a broken journal or
+the max age starts another, and lookups keep reading the previous index
+meanwhile. Only before the first build is done does a lookup rank the
+providers of the one service type asked for in the database.
+"""
+import bisect
+import threading
+import time
+from collections import defaultdict
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, F, FloatField, Q, Value
+from django.db.models.functions import Cast
+
+SEQUENCE_KEY = 'servicerequests:ranking:sequence'
+ENTRY_KEY = 'servicerequests:ranking:entry:%d'
+# journal entry for a change to every provider
+EVERYONE = 'all'
+# how long journal entries are kept; a process idle for longer rebuilds
+JOURNAL_TIMEOUT = 24 * 60 * 60
+# entries a process replays before it rebuilds instead
+MAX_REPLAY = 500
+# how long an entry may be missing (its writer between the increment and
+# the write) before the journal counts as broken
+MISSING_GRACE = 2.0
+
+# score weights, see score()
+STARS_WEIGHT = 0.6
+HISTORY_WEIGHT = 0.25
+LOAD_WEIGHT = 0.15
+# a provider's stars count as PRIOR_RATINGS extra ratings of PRIOR_STARS,
+# so a single 5.0 does not outrank a long record of 4.8s
+PRIOR_STARS = 3.5
+PRIOR_RATINGS = 3
+# completed requests at which the history term reaches half its weight
+HISTORY_HALF = 10
+
+
+def score(rating_count, rating_sum, in_progress, completed):
+    """Ranking score between 0 and 1 of a provider's current numbers."""
+    stars = (float(rating_sum) + PRIOR_STARS * PRIOR_RATINGS) / (rating_count + PRIOR_RATINGS)
+    return (
+        STARS_WEIGHT * stars / 5
+        + HISTORY_WEIGHT * completed / (completed + HISTORY_HALF)
+        + LOAD_WEIGHT / (1 + in_progress)
+    )
+
+
+def score_expression():
+    """``score()`` as a database expression over a ``Provider`` annotated with
+    ``in_progress`` and ``completed``."""
+    def number(value):
+        return Value(float(value), output_field=FloatField())
+
+    def column(name):
+        return Cast(name, FloatField())
+
+    stars = (column('rating_sum') + number(PRIOR_STARS * PRIOR_RATINGS)) / (column('rating_count') + number(PRIOR_RATINGS))
+    return (
+        number(STARS_WEIGHT / 5) * stars
+        + number(HISTORY_WEIGHT) * column('completed') / (column('completed') + number(HISTORY_HALF))
+        + number(LOAD_WEIGHT) / (number(1) + column('in_progress'))
+    )
+
+
+class ProviderState(NamedTuple):
+    provider_id: int
+    user_id: int
+    is_active: bool
+    stars: float
+    in_progress: int
+    completed: int
+    service_type_ids: frozenset
+    score: float
+
+    @property
+    def key(self):
+        # ascending order of keys is best score first; the id breaks ties
+        return (-self.score, self.provider_id)
+
+
+def load_states(provider_ids=None):
+    """``ProviderState`` of the providers ``provider_ids`` (all if None), from three queries."""
+    from providers.models import Provider
+    from .models import ServiceRequest
+
+    providers = Provider.objects.all()
+    through = Provider.service_types.through.objects.all()
+    requests = ServiceRequest.objects.filter(
+        status__in=(ServiceRequest.STATUS_IN_PROGRESS, ServiceRequest.STATUS_COMPLETED),
+    )
+    if provider_ids is not None:
+        providers = providers.filter(pk__in=provider_ids)
+        through = through.filter(provider_id__in=provider_ids)
+        requests = requests.filter(provider_id__in=provider_ids)
+    else:
+        requests = requests.filter(provider__isnull=False)
+
+    service_types = defaultdict(set)
+    for provider_id, type_id in through.values_list('provider_id', 'servicetype_id'):
+        service_types[provider_id].add(type_id)
+    counts = {
+        provider_id: (in_progress, completed)
+        for provider_id, in_progress, completed in requests.values('provider_id').annotate(
+            in_progress=Count('pk', filter=Q(status=ServiceRequest.STATUS_IN_PROGRESS)),
+            completed=Count('pk', filter=Q(status=ServiceRequest.STATUS_COMPLETED)),
+        ).values_list('provider_id', 'in_progress', 'completed').order_by()
+    }
+    rows = providers.values_list('pk', 'user_id', 'is_active', 'stars', 'rating_count', 'rating_sum')
+    states = []
+    for pk, user_id, is_active, stars, rating_count, rating_sum in rows:
+        in_progress, completed = counts.get(pk, (0, 0))
+        states.append(ProviderState(
+            pk, user_id, is_active, float(stars), in_progress, completed,
+            frozenset(service_types.get(pk, ())), score(rating_count, rating_sum, in_progress, completed),
+        ))
+    return states
+
+
+def load_top(service_type_id, k, exclude_user_ids=()):
+    """The ``k`` best active providers offering ``service_type_id``, ranked in one query.
+
+    Their ``service_type_ids`` hold just ``service_type_id``.
+    """
+    from providers.models import Provider
+    from .models import ServiceRequest
+
+    rows = (
+        Provider.objects.filter(is_active=True, service_types=service_type_id)
+        .exclude(user_id__in=exclude_user_ids)
+        .annotate(
+            in_progress=Count('assigned_requests', filter=Q(assigned_requests__status=ServiceRequest.STATUS_IN_PROGRESS)),
+            completed=Count('assigned_requests', filter=Q(assigned_requests__status=ServiceRequest.STATUS_COMPLETED)),
+        )
+        .annotate(score=score_expression())
+        .order_by(F('score').desc(), 'pk')
+        .values_list('pk', 'user_id', 'stars', 'rating_count', 'rating_sum', 'in_progress', 'completed')[:k]
+    )
+    return [
+        ProviderState(
+            pk, user_id, True, float(stars), in_progress, completed,
+            frozenset((service_type_id,)), score(rating_count, rating_sum, in_progress, completed),
+        )
+        for pk, user_id, stars, rating_count, rating_sum, in_progress, completed in rows
+    ]
+
+
+class RankingIndex:
+    """Providers by service type, best score first (see the module docstring)."""
+
+    def __init__(self):
+        self.states = {}
+        # service type id -> sorted list of ProviderState.key
+        self.partitions = defaultdict(list)
+        # journal position applied, None until the index is built
+        self.sequence = None
+        # time.monotonic() when the data of the last build was read
+        self.built_at = None
+        # set while the index misses changes and a rebuild is due
+        self.stale = False
+        self._missing_since = None
+        self._lock = threading.Lock()
+        self._rebuilding = None
+
+    def put(self, state):
+        with self._lock:
+            self._discard(state.provider_id)
+            self.states[state.provider_id] = state
+            if state.is_active:
+                for service_type_id in state.service_type_ids:
+                    bisect.insort(self.partitions[service_type_id], state.key)
+
+    def discard(self, provider_id):
+        with self._lock:
+            self._discard(provider_id)
+
+    def _discard(self, provider_id):
+        old = self.states.pop(provider_id, None)
+        if old is None or not old.is_active:
+            return
+        for service_type_id in old.service_type_ids:
+            partition = self.partitions[service_type_id]
+            position = bisect.bisect_left(partition, old.key)
+            if position < len(partition) and partition[position] == old.key:
+                del partition[position]
+
+    def top(self, service_type_id, k, exclude_user_ids=()):
+        """The ``k`` best active providers offering ``service_type_id``, as ``ProviderState``."""
+        with self._lock:
+            result = []
+            for _, provider_id in self.partitions.get(service_type_id, ()):
+                state = self.states[provider_id]
+                if state.user_id in exclude_user_ids:
+                    continue
+                result.append(state)
+                if len(result) == k:
+                    break
+            return result
+
+    def rebuild(self, sequence):
+        built_at = time.monotonic()
+        states = load_states()
+        partitions = defaultdict(list)
+        for state in states:
+            if state.is_active:
+                for service_type_id in state.service_type_ids:
+                    partitions[service_type_id].append(state.key)
+        for partition in partitions.values():
+            partition.sort()
+        with self._lock:
+            self.states = {state.provider_id: state for state in states}
+            self.partitions = partitions
+            self.sequence = sequence
+            self.built_at = built_at
+            self.stale = False
+            self._missing_since = None
+
+    def rebuild_in_background(self, sequence):
+        """``rebuild(sequence)`` in a thread, unless one is already running."""
+        with self._lock:
+            if self._rebuilding is not None and self._rebuilding.is_alive():
+                return
+            self._rebuilding = threading.Thread(
+                target=self._rebuild_thread, args=(sequence,), name='ranking-index-rebuild', daemon=True,
+            )
+            self._rebuilding.start()
+
+    def _rebuild_thread(self, sequence):
+        try:
+            self.rebuild(sequence)
+        finally:
+            # the thread's own database connection
+            connection.close()
+
+    def reload(self, provider_ids):
+        """Re-read ``provider_ids`` from the database (dropping the deleted ones)."""
+        states = load_states(provider_ids)
+        for provider_id in set(provider_ids) - {state.provider_id for state in states}:
+            self.discard(provider_id)
+        for state in states:
+            self.put(state)
+
+    def sync(self):
+        """Replay the journal entries this index has not applied yet.
+
+        Returns whether the index is current; when it is not, a rebuild is
+        running in the background. An index older than
+        ``SERVICE_REQUEST_RANKING_MAX_AGE`` stays current while it is rebuilt.
+        """
+        head = _journal_head()
+        if self.stale or self.sequence is None or head < self.sequence or head - self.sequence > MAX_REPLAY:
+            self._rebuild_later(head)
+            return False
+        if time.monotonic() - self.built_at > settings.SERVICE_REQUEST_RANKING_MAX_AGE:
+            self.rebuild_in_background(head)
+        if head == self.sequence:
+            return True
+        keys = [ENTRY_KEY % sequence for sequence in range(self.sequence + 1, head + 1)]
+        entries = cache.get_many(keys)
+        changed = set()
+        applied = self.sequence
+        for key in keys:
+            if key not in entries:
+                break
+            if entries[key] == EVERYONE:
+                self._rebuild_later(head)
+                return False
+            changed.update(entries[key])
+            applied += 1
+        if applied < head:
+            # the entry after ``applied`` is missing: wait for its writer,
+            # or rebuild when it has expired
+            now = time.monotonic()
+            if self._missing_since is None or self._missing_since[0] != applied:
+                self._missing_since = (applied, now)
+            elif now - self._missing_since[1] > MISSING_GRACE:
+                self._rebuild_later(head)
+                return False
+        if changed:
+            self.reload(changed)
+        self.sequence = applied
+        return True
+
+    def _rebuild_later(self, head):
+        self.stale = True
+        self.rebuild_in_background(head)
+
+
+def _journal_head():
+    cache.add(SEQUENCE_KEY, 0, timeout=None)
+    head = cache.get(SEQUENCE_KEY)
+    return 0 if head is None else head
+
+
+def _append(entry):
+    cache.add(SEQUENCE_KEY, 0, timeout=None)
+    try:
+        sequence = cache.incr(SEQUENCE_KEY)
+    except ValueError:
+        # the key was evicted in between: every index rebuilds
+        cache.add(SEQUENCE_KEY, 0, timeout=None)
+        return
+    cache.set(ENTRY_KEY % sequence, entry, timeout=JOURNAL_TIMEOUT)
+
+
+def providers_changed(provider_ids):
+    """Record that the ranking inputs of ``provider_ids`` changed (None: of every provider).
+
+    The journal entry is written when the current transaction commits.
+    """
+    if provider_ids is None:
+        entry = EVERYONE
+    else:
+        entry = sorted({pk for pk in provider_ids if pk is not None})
+        if not entry:
+            return
+    transaction.on_commit(lambda: _append(entry))
+
+
+_index = RankingIndex()
+_sync_lock = threading.Lock()
+
+
+def get_index():
+    """This process's ``RankingIndex``, or None until it is first built.
+
+    The index is caught up with the journal unless a rebuild is running;
+    until that is done it is the previous build.
+    """
+    with _sync_lock:
+        _index.sync()
+    return _index if _index.sequence is not None else None
+
+
+def warm_up():
+    """Start building this process's index in the background."""
+    _index.rebuild_in_background(_journal_head())
+
+
+def top_candidates(service_request, k=10):
+    """The ``k`` best providers for ``service_request``, as ``ProviderState``.
+
+    Active providers offering the request's service type, other than its
+    client.
+    """
+    if service_request.service_type_id is None:
+        return []
+    exclude_user_ids = {service_request.client_id}
+    index = get_index()
+    if index is not None:
+        return index.top(service_request.service_type_id, k, exclude_user_ids)
+    # the first build is running
+    return load_top(service_request.service_type_id, k, exclude_user_ids)
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0010_alter_provider_cpf_cnpj'),
+        ('servicerequests', '0005_servicerequest_completion_date'),
+        ('services', '0002_remove_servicetype_description'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['service_type', '-requested_date', '-id'], name='sr_pending_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['provider', '-requested_date', '-id'], name='sr_provider_date_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0010_alter_provider_cpf_cnpj'),
+        ('servicerequests', '0006_provider_feed_indexes'),
+        ('services', '0002_remove_servicetype_description'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # create the composite indexes before dropping the plain FK ones
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['provider', 'status'], name='sr_provider_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['client', '-requested_date', '-id'], name='sr_client_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['-requested_date', '-id'], name='sr_requested_date_idx'),
+        ),
+        migrations.AlterField(
+            model_name='servicerequest',
+            name='client',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='made_requests', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='servicerequest',
+            name='provider',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='assigned_requests', to='providers.provider'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('servicerequests', '0008_servicerequest_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['updated_at', 'id'], name='sr_updated_at_idx'),
+        ),
+    ]
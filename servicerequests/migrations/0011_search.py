@@ -0,0 +1,23 @@
+from django.db import migrations
+from app.search import SearchIndex
+
+INDEX = SearchIndex('sr_search', (('title', 'A'), ('description', 'B')))
+
+
+def install(apps, schema_editor):
+    INDEX.install(schema_editor, apps.get_model('servicerequests', 'ServiceRequest')._meta.db_table)
+
+
+def uninstall(apps, schema_editor):
+    INDEX.uninstall(schema_editor, apps.get_model('servicerequests', 'ServiceRequest')._meta.db_table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('servicerequests', '0010_location'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
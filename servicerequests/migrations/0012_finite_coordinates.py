@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:58
+
+import app.geo
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('servicerequests', '0011_search'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='servicerequest',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[app.geo.validate_finite, django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AlterField(
+            model_name='servicerequest',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[app.geo.validate_finite, django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+    ]
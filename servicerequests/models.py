@@ -1,10 +1,141 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from services.models import ServiceType
 from providers.models import Provider
-from decimal import Decimal
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Now
 from django.utils import timezone
+from app import geo
+from app.pagination import keyset_filter
+from app.search import SearchIndex
+
+
+def completion_date_for(old_status, status, completion_date, now=None):
+    """``completion_date`` after a status change from ``old_status`` to ``status``.
+
+    Entering COMPLETED stamps the current time, leaving it clears the date;
+    any other change keeps it. ``old_status`` is None for new rows.
+    """
+    if status == ServiceRequest.STATUS_COMPLETED:
+        if old_status != ServiceRequest.STATUS_COMPLETED or not completion_date:
+            return now or timezone.now()
+    elif old_status == ServiceRequest.STATUS_COMPLETED:
+        return None
+    return completion_date
+
+
+class ServiceRequestQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """Set ``completion_date`` alongside ``status`` unless the caller does.
+
+        The new date is computed in the same statement from each row's old
+        status, with the same rules as ``ServiceRequest.save()``. Only a
+        literal status value is handled; pass ``completion_date`` explicitly
+        when setting ``status`` to an expression. ``updated_at`` is set to
+        the current time unless given.
+        """
+        kwargs.setdefault('updated_at', Now())
+        new_status = kwargs.get('status')
+        if isinstance(new_status, str) and 'completion_date' not in kwargs:
+            was_completed = models.Q(status=ServiceRequest.STATUS_COMPLETED)
+            if new_status == ServiceRequest.STATUS_COMPLETED:
+                kwargs['completion_date'] = models.Case(
+                    models.When(was_completed, then=Coalesce('completion_date', Now())),
+                    default=Now(),
+                )
+            else:
+                kwargs['completion_date'] = models.Case(
+                    models.When(was_completed, then=models.Value(None, output_field=models.DateTimeField())),
+                    default=models.F('completion_date'),
+                )
+        return super().update(**kwargs)
+
+    update.alters_data = True
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        """``bulk_update`` that keeps ``completion_date`` in step with ``status``.
+
+        Each object's old status comes from the state it was loaded with;
+        objects built by hand have theirs read in one query.
+        """
+        fields = list(fields)
+        objs = list(objs)
+        if 'updated_at' not in fields:
+            now = timezone.now()
+            for obj in objs:
+                obj.updated_at = now
+            fields.append('updated_at')
+        if 'status' in fields:
+            unknown = [obj.pk for obj in objs if 'status' not in obj._loaded_values]
+            stored = dict(self.model._base_manager.filter(pk__in=unknown).values_list('pk', 'status')) if unknown else {}
+            now = timezone.now()
+            for obj in objs:
+                old_status = obj._loaded_values.get('status', stored.get(obj.pk))
+                obj.completion_date = completion_date_for(old_status, obj.status, obj.completion_date, now)
+            if 'completion_date' not in fields:
+                fields.append('completion_date')
+        rows = super().bulk_update(objs, fields, batch_size=batch_size)
+        for obj in objs:
+            obj._snapshot(fields)
+        return rows
+
+    bulk_update.alters_data = True
+
+    def provider_feed(self, provider_id, service_type_ids, limit=None, position=None, reverse=False):
+        """Jobs visible to a provider: open requests for its service types plus its own.
+
+        Each branch (one per service type, plus the provider's own jobs) is
+        served by its own index, so no DISTINCT and no OR across a subquery
+        is needed: the branches are combined with UNION ALL inside an ``IN``
+        subquery. With ``limit`` each branch reads only one window, the first
+        ``limit`` rows in index order after ``position`` (a
+        ``(requested_date, id)`` pair, exclusive), so a page costs the same
+        at any depth; the result then holds up to ``limit`` rows per branch,
+        to be sliced (or paginated) down to the page. No query runs until the
+        result is evaluated.
+
+        The result is ordered newest-first with ``id`` as tie-breaker, which
+        keeps it stable under pagination.
+        """
+        service_type_ids = list(service_type_ids)
+        open_jobs = ServiceRequest.objects.filter(status=ServiceRequest.STATUS_PENDING)
+        own_jobs = ServiceRequest.objects.filter(provider_id=provider_id)
+        if limit is None:
+            branches = open_jobs.filter(service_type_id__in=service_type_ids).values('pk')
+            branches = branches.union(own_jobs.values('pk'), all=True)
+            return self.filter(pk__in=branches).order_by(*ServiceRequest.LIST_ORDERING)
+
+        ordering = ('requested_date', 'id') if reverse else ServiceRequest.LIST_ORDERING
+        branches = [open_jobs.filter(service_type_id=pk) for pk in service_type_ids]
+        branches.append(own_jobs)
+        parts = []
+        params = []
+        for number, branch in enumerate(branches):
+            if position is not None:
+                branch = branch.filter(keyset_filter(ServiceRequest.LIST_ORDERING, position, reverse))
+            sql, branch_params = branch.order_by(*ordering).values('pk')[:limit].query.sql_with_params()
+            # SQLite takes no LIMIT on a member of a compound SELECT, only on
+            # a subquery in FROM
+            parts.append(f'SELECT * FROM ({sql}) AS branch_{number}')
+            params.extend(branch_params)
+        # a pending job already assigned to the provider is in two branches,
+        # which the IN collapses
+        page_ids = RawSQL(' UNION ALL '.join(parts), params)
+        return self.filter(pk__in=page_ids).order_by(*ServiceRequest.LIST_ORDERING)
+
+    def open_near(self, latitude, longitude, km, service_type_ids=None, limit=None):
+        """``[(distance_km, pk), ...]``, nearest first, of the PENDING requests within ``km`` of the point.
+
+        The candidates are read from a few geohash ranges of the
+        ``(status, geohash)`` index (``app.geo.cover``), then their exact
+        distance is checked. ``service_type_ids`` keeps only those service types.
+        """
+        rows = self.filter(geo.cover_q('geohash', latitude, longitude, km), status=ServiceRequest.STATUS_PENDING)
+        if service_type_ids is not None:
+            rows = rows.filter(service_type_id__in=list(service_type_ids))
+        found = geo.within(rows.values_list('pk', 'latitude', 'longitude'), latitude, longitude, km)
+        return [(distance, row[0]) for distance, row in found[:limit]]
 
 
 class ServiceRequest(models.Model):
@@ -20,15 +151,24 @@ class ServiceRequest(models.Model):
         (STATUS_CANCELLED, 'Cancelled'),
     ]
 
+    # newest first; id breaks ties so keyset pagination is stable
+    LIST_ORDERING = ('-requested_date', '-id')
+
     title = models.CharField(max_length=200)
     description = models.TextField()
     address = models.CharField(max_length=255)
+    # located from the address (app.geo); geohash indexes the point
+    latitude = models.FloatField(null=True, blank=True, validators=[geo.validate_finite, MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[geo.validate_finite, MinValueValidator(-180), MaxValueValidator(180)])
+    geohash = models.CharField(max_length=12, null=True, blank=True, editable=False)
     requested_date = models.DateTimeField(auto_now_add=True)
 
+    # client and provider lookups are served by the composite indexes in Meta
     client = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='made_requests'
+        related_name='made_requests',
+        db_index=False,
     )
 
     service_type = models.ForeignKey(
@@ -43,29 +183,96 @@ class ServiceRequest(models.Model):
         on_delete=models.SET_NULL,
         null=True,
         blank=True,
-        related_name='assigned_requests'
+        related_name='assigned_requests',
+        db_index=False,
     )
 
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
     completion_date = models.DateTimeField(null=True, blank=True)
+    # bumped by every change to the request's payload (conditional GET)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ServiceRequestQuerySet.as_manager()
+
+    # relations read by __str__, used by app.prefetch
+    str_select_related = ('client',)
+    # full-text index of the title and description, created by migration 0011
+    search_index = SearchIndex('sr_search', (('title', 'A'), ('description', 'B')))
+
+    class Meta:
+        indexes = [
+            # provider feed: open jobs by service type, newest first
+            models.Index(
+                fields=['service_type', '-requested_date', '-id'],
+                condition=models.Q(status='PENDING'),
+                name='sr_pending_type_date_idx',
+            ),
+            # provider feed: jobs assigned to the provider
+            models.Index(fields=['provider', '-requested_date', '-id'], name='sr_provider_date_idx'),
+            # a provider's jobs by status (workload, transitions)
+            models.Index(fields=['provider', 'status'], name='sr_provider_status_idx'),
+            # a client's history
+            models.Index(fields=['client', '-requested_date', '-id'], name='sr_client_date_idx'),
+            # staff listing
+            models.Index(fields=['-requested_date', '-id'], name='sr_requested_date_idx'),
+            # incremental export (servicerequests.export)
+            models.Index(fields=['updated_at', 'id'], name='sr_updated_at_idx'),
+            # open jobs near a point, see app.geo.cover()
+            # (a partial index on status would not be range-searched per cell
+            # by SQLite's OR optimisation)
+            models.Index(fields=['status', 'geohash'], name='sr_status_geohash_idx'),
+        ]
 
     def __str__(self):
         return f"ServiceRequest: {self.title} by {self.client.username}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot()
+        return instance
+
+    @property
+    def _loaded_values(self):
+        # values of the row as last loaded from or written to the database
+        return self.__dict__.get('_loaded', {})
+
+    def _snapshot(self, fields=None):
+        loaded = dict(self._loaded_values)
+        if fields is None:
+            deferred = self.get_deferred_fields()
+            fields = [f.attname for f in self._meta.concrete_fields if f.attname not in deferred]
+        else:
+            fields = [self._meta.get_field(name).attname for name in fields]
+        for attname in fields:
+            loaded[attname] = getattr(self, attname)
+        self._loaded = loaded
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._snapshot(fields)
+
     def save(self, *args, **kwargs):
-        try:
-            old = ServiceRequest.objects.get(pk=self.pk)
-            old_status = old.status
-        except ServiceRequest.DoesNotExist:
+        if self._state.adding:
             old_status = None
+        elif 'status' in self._loaded_values:
+            old_status = self._loaded_values['status']
+        else:
+            # built by hand or loaded with status deferred
+            old_status = ServiceRequest._base_manager.filter(pk=self.pk).values_list('status', flat=True).first()
 
-        if self.status == self.STATUS_COMPLETED and (old_status != self.STATUS_COMPLETED or not self.completion_date):
-            self.completion_date = timezone.now()
-
-        if self.status != self.STATUS_COMPLETED and old_status == self.STATUS_COMPLETED:
-            self.completion_date = None
+        completion_date = completion_date_for(old_status, self.status, self.completion_date)
+        update_fields = kwargs.get('update_fields')
+        if completion_date != self.completion_date and update_fields is not None and 'completion_date' not in update_fields:
+            kwargs['update_fields'] = update_fields = [*update_fields, 'completion_date']
+        # auto_now only writes updated_at when it is among update_fields
+        if update_fields is not None and 'updated_at' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'updated_at']
+        self.completion_date = completion_date
+        kwargs = geo.set_geohash(self, kwargs)
 
         super().save(*args, **kwargs)
+        self._snapshot(kwargs.get('update_fields'))
 
 
 class Rating(models.Model):
@@ -80,14 +287,28 @@ class Rating(models.Model):
     comment = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    str_select_related = ('provider', 'reviewer')
+
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        from django.db.models import Avg
-        avg = self.provider.ratings.aggregate(avg_score=Avg('score'))['avg_score']
-        if avg is None:
-            avg = Decimal('0.00')
-        self.provider.stars = avg
-        self.provider.save()
+        with transaction.atomic():
+            old = None
+            if not self._state.adding:
+                old = Rating.objects.filter(pk=self.pk).values('provider_id', 'score').first()
+            super().save(*args, **kwargs)
+            score = self._meta.get_field('score').to_python(self.score)
+            if old is not None:
+                Provider.objects.filter(pk=old['provider_id']).update(**Provider.rating_changes(-1, -old['score']))
+            Provider.objects.filter(pk=self.provider_id).update(**Provider.rating_changes(1, score))
+            # the rating is part of the request's payload
+            ServiceRequest.objects.filter(pk=self.service_request_id).update(updated_at=Now())
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            score = self._meta.get_field('score').to_python(self.score)
+            Provider.objects.filter(pk=self.provider_id).update(**Provider.rating_changes(-1, -score))
+            ServiceRequest.objects.filter(pk=self.service_request_id).update(updated_at=Now())
+        return result
 
     def __str__(self):
         return f"Rating: {self.score} for {self.provider} by {self.reviewer}"
\ No newline at end of file
@@ -0,0 +1,6 @@
+from app.pagination import KeysetPagination
+from .models import ServiceRequest
+
+
+class ServiceRequestPagination(KeysetPagination):
+    ordering = ServiceRequest.LIST_ORDERING
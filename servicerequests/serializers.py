@@ -1,8 +1,12 @@
 from rest_framework import serializers
+from app import geo
 from .models import ServiceRequest
 from .models import Rating
 from providers.serializers import ProviderSerializer
 from providers.models import Provider
+from services.serializers import ServiceTypeSerializer
+from users.serializers import PublicUserSerializer
+from .transitions import TRANSITIONS
 
 
 class RatingSerializer(serializers.ModelSerializer):
@@ -20,8 +24,17 @@ class ServiceRequestCreateUpdateSerializer(serializers.ModelSerializer):
     )
     class Meta:
         model = ServiceRequest
-        fields = ['id', 'title', 'description', 'address', 'service_type', 'provider']
+        fields = ['id', 'title', 'description', 'address', 'latitude', 'longitude', 'service_type', 'provider']
         read_only_fields = ['id']
+
+    def validate(self, attrs):
+        return geo.validate_point(attrs)
+
+    def create(self, validated_data):
+        return super().create(geo.locate(validated_data))
+
+    def update(self, instance, validated_data):
+        return super().update(instance, geo.locate(validated_data))
         
 
 class ServiceRequestDetailSerializer(serializers.ModelSerializer):
@@ -32,7 +45,21 @@ class ServiceRequestDetailSerializer(serializers.ModelSerializer):
     status = serializers.CharField()
     rating = RatingSerializer(read_only=True)
 
+    # nested serializers for ?expand= (app.sparse)
+    expandable_fields = {
+        'client': PublicUserSerializer,
+        'service_type': ServiceTypeSerializer,
+        'provider': ProviderSerializer,
+    }
+
     class Meta:
         model = ServiceRequest
-        fields = ['id', 'title', 'description', 'address', 'requested_date', 'completion_date', 'client', 'service_type', 'provider', 'provider_id', 'status', 'rating']
-        read_only_fields = ['requested_date', 'completion_date']
\ No newline at end of file
+        fields = ['id', 'title', 'description', 'address', 'latitude', 'longitude', 'requested_date', 'completion_date', 'client', 'service_type', 'provider', 'provider_id', 'status', 'rating']
+        read_only_fields = ['requested_date', 'completion_date']
+
+
+class BulkTransitionSerializer(serializers.Serializer):
+    MAX_IDS = 100
+
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=MAX_IDS)
+    action = serializers.ChoiceField(choices=sorted(TRANSITIONS))
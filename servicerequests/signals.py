@@ -0,0 +1,33 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from providers.models import Provider
+from .matching import providers_changed
+from .models import ServiceRequest, Rating
+
+
+@receiver([post_save, post_delete], sender=Provider)
+def provider_changed(sender, instance, **kwargs):
+    providers_changed([instance.pk])
+
+
+@receiver(m2m_changed, sender=Provider.service_types.through)
+def provider_service_types_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        providers_changed([instance.pk])
+    elif pk_set:
+        providers_changed(pk_set)
+
+
+@receiver([post_save, post_delete], sender=Rating)
+def rating_changed(sender, instance, **kwargs):
+    # the provider's rating totals
+    providers_changed([instance.provider_id])
+
+
+@receiver([post_save, post_delete], sender=ServiceRequest)
+def service_request_changed(sender, instance, **kwargs):
+    # workload and history of the provider it is (and was) assigned to;
+    # transitions write with update() and report their changes themselves
+    providers_changed([instance.provider_id, instance._loaded_values.get('provider_id')])
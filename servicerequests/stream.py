@@ -0,0 +1,89 @@
+"""Server-Sent Events feed of open jobs for providers.
+
+``GET /api/service-requests/stream/`` keeps the connection open and pushes
+an ``event: job`` message whenever a request for one of the provider's
+service types is created or reopened, so providers no longer need to poll
+the list endpoint. It is an async view and needs to be served over ASGI
+(``app.asgi``): a WSGI server reads the whole body before sending any of
+it, which for an endless stream means never answering while holding a
+worker, so requests that did not come through ASGI get a 501.
+
+Browsers' ``EventSource`` cannot send headers, so the access token is also
+accepted as ``?token=``.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from users.authentication import CachedJWTAuthentication
+
+from .broker import get_broker
+
+HEARTBEAT_SECONDS = getattr(settings, 'SERVICE_REQUEST_STREAM_HEARTBEAT', 15)
+
+
+def _authenticate(request):
+    """Return the ``Actor`` of the token's user, or raise."""
+    authentication = CachedJWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token is None and request.GET.get('token'):
+        raw_token = request.GET['token'].encode()
+    if raw_token is None:
+        raise AuthenticationFailed('Authentication credentials were not provided.')
+    return authentication.get_user(authentication.get_validated_token(raw_token)).actor
+
+
+def _message(event, data=None, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, cls=DjangoJSONEncoder)}')
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+async def _events(service_type_ids):
+    # subscribing here ties the subscription's lifetime to the stream's
+    subscription = get_broker().subscribe(service_type_ids)
+    try:
+        yield _message('ready', {'service_type_ids': sorted(subscription.service_type_ids)})
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # comment line: keeps proxies from closing an idle connection
+                yield b': keepalive\n\n'
+                continue
+            yield _message('job', event, event_id=event['id'])
+            if subscription.overflowed:
+                # events were dropped: the client should refetch the list
+                subscription.overflowed = False
+                yield _message('overflow')
+    finally:
+        subscription.close()
+
+
+@require_GET
+async def job_stream(request):
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'detail': 'The job stream is only served over ASGI.'}, status=501)
+    try:
+        actor = await sync_to_async(_authenticate)(request)
+    except (AuthenticationFailed, InvalidToken) as exc:
+        detail = exc.detail.get('detail') if isinstance(exc.detail, dict) else exc.detail
+        return JsonResponse({'detail': str(detail)}, status=401)
+    if not actor.is_provider:
+        return JsonResponse({'detail': 'Only providers can subscribe to the job stream.'}, status=403)
+
+    response = StreamingHttpResponse(_events(actor.service_type_ids), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # stops nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,3 +1,36 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from providers.models import Provider
+from services.models import ServiceType
 
-# Create your tests here.
+
+class JobStreamTests(TestCase):
+    url = '/api/service-requests/stream/'
+
+    @classmethod
+    def setUpTestData(cls):
+        service_type = ServiceType.objects.create(name='Elétrica')
+        user = get_user_model().objects.create_user(username='provider', email='provider@example.com', password='pw')
+        provider = Provider.objects.create(user=user, cpf_cnpj='1', is_active=True)
+        provider.service_types.set([service_type])
+        cls.auth = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+
+    def test_wsgi_request_is_refused(self):
+        # a WSGI server would wait for the end of the endless body
+        response = self.client.get(self.url, headers=self.auth)
+        self.assertEqual(response.status_code, 501)
+
+    async def test_asgi_request_streams(self):
+        response = await self.async_client.get(self.url, headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        try:
+            self.assertTrue((await anext(events)).startswith(b'event: ready\n'))
+        finally:
+            await events.aclose()
+
+    async def test_asgi_request_needs_a_token(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,263 @@
+"""State transitions for service requests as single guarded UPDATEs.
+
+Each state change is one ``UPDATE ... WHERE <preconditions>`` statement:
+the database checks the current state and applies the change atomically,
+so no row lock is held across round trips and concurrent attempts cannot
+both succeed. A plain read before it turns away attempts that cannot
+succeed (the common case when many providers race for one request) without
+writing; when the UPDATE itself matches no row, the row is read again to
+report the right 400/403/404/409. Both reads go through the queryset of
+requests the actor can see, so a request outside it is a 404 whatever
+its state, as for any other detail route.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.db.models.functions import Now
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+from .models import ServiceRequest
+from . import events, matching
+
+
+class TransitionError(APIException):
+    def __init__(self, detail, status_code):
+        super().__init__(detail)
+        self.status_code = status_code
+
+
+def _forbidden(detail):
+    return TransitionError(detail, status.HTTP_403_FORBIDDEN)
+
+
+def _invalid(detail):
+    return TransitionError(detail, status.HTTP_400_BAD_REQUEST)
+
+
+def _conflict(detail):
+    return TransitionError(detail, status.HTTP_409_CONFLICT)
+
+
+class Transition:
+    """A state change: who may attempt it, on which rows, and what it writes.
+
+    ``authorize`` rejects actors up front, ``guard`` is the WHERE clause the
+    UPDATE runs with and ``values`` the columns it sets. ``check`` raises the
+    error for a row that visibly fails the preconditions; ``explain`` does the
+    same for a row the UPDATE did not match, falling back to 409 when the
+    row changed in between. Rows are dicts with ``client_id``,
+    ``provider_id``, ``status`` and ``service_type_id``.
+    """
+
+    name = None
+    status = None  # the status the transition moves requests to
+    conflict_message = 'This service request changed, try again.'
+
+    def authorize(self, actor):
+        pass
+
+    def guard(self, actor):
+        raise NotImplementedError
+
+    def values(self, actor):
+        raise NotImplementedError
+
+    def check(self, row, actor):
+        raise NotImplementedError
+
+    def explain(self, row, actor):
+        self.check(row, actor)
+        raise _conflict(self.conflict_message)
+
+
+class Accept(Transition):
+    name = 'accept'
+    status = ServiceRequest.STATUS_IN_PROGRESS
+
+    def authorize(self, actor):
+        if not actor.is_provider:
+            raise _forbidden('Only providers can accept service requests.')
+
+    def guard(self, actor):
+        return (
+            Q(status=ServiceRequest.STATUS_PENDING)
+            & ~Q(client_id=actor.user_id)
+            & (Q(provider__isnull=True, service_type_id__in=actor.service_type_ids) | Q(provider_id=actor.provider_id))
+        )
+
+    def values(self, actor):
+        return {'provider_id': actor.provider_id, 'status': self.status, 'completion_date': None}
+
+    def check(self, row, actor):
+        if row['client_id'] == actor.user_id:
+            raise _invalid('Client cannot accept their own request.')
+        taken = row['provider_id'] is not None and row['provider_id'] != actor.provider_id
+        if taken and row['status'] in (ServiceRequest.STATUS_PENDING, ServiceRequest.STATUS_IN_PROGRESS):
+            raise _conflict('This service request already has a provider.')
+        if row['status'] != ServiceRequest.STATUS_PENDING:
+            raise _invalid('Only pending requests can be accepted.')
+
+    def explain(self, row, actor):
+        # the offered service types are only checked by the UPDATE's guard
+        self.check(row, actor)
+        if row['provider_id'] is None and not actor.offers(row['service_type_id']):
+            raise _forbidden('Provider does not offer this type of service.')
+        raise _conflict(self.conflict_message)
+
+
+class Reject(Transition):
+    name = 'reject'
+    status = ServiceRequest.STATUS_PENDING
+
+    def authorize(self, actor):
+        if not actor.is_provider:
+            raise _forbidden('Only providers can reject service requests.')
+
+    def guard(self, actor):
+        return Q(provider_id=actor.provider_id) & ~Q(status=ServiceRequest.STATUS_COMPLETED)
+
+    def values(self, actor):
+        # unassign and reopen so other providers can accept
+        return {'provider_id': None, 'status': self.status, 'completion_date': None}
+
+    def check(self, row, actor):
+        if row['status'] == ServiceRequest.STATUS_COMPLETED:
+            raise _invalid('Completed requests cannot be rejected.')
+        if row['provider_id'] is None:
+            raise _invalid('This service request has no assigned provider to reject.')
+        if row['provider_id'] != actor.provider_id:
+            raise _forbidden('You are not the assigned provider for this request.')
+
+
+class Finish(Transition):
+    name = 'finish'
+    status = ServiceRequest.STATUS_COMPLETED
+
+    def authorize(self, actor):
+        if not actor.is_provider:
+            raise _forbidden('Only providers can finish service requests.')
+
+    def guard(self, actor):
+        return Q(provider_id=actor.provider_id, status=ServiceRequest.STATUS_IN_PROGRESS)
+
+    def values(self, actor):
+        return {'status': self.status, 'completion_date': Now()}
+
+    def check(self, row, actor):
+        if row['provider_id'] != actor.provider_id:
+            raise _forbidden('You are not the assigned provider for this request.')
+        if row['status'] != ServiceRequest.STATUS_IN_PROGRESS:
+            raise _invalid('Only in-progress requests can be finished.')
+
+
+class Cancel(Transition):
+    name = 'cancel'
+    status = ServiceRequest.STATUS_CANCELLED
+
+    def guard(self, actor):
+        party = Q(client_id=actor.user_id)
+        if actor.is_provider:
+            party |= Q(provider_id=actor.provider_id)
+        return party & ~Q(status=ServiceRequest.STATUS_COMPLETED)
+
+    def values(self, actor):
+        return {'status': self.status}
+
+    def check(self, row, actor):
+        is_client = row['client_id'] == actor.user_id
+        is_provider = actor.is_provider and row['provider_id'] == actor.provider_id
+        if not (is_client or is_provider):
+            raise _forbidden('Only the client or assigned provider can cancel this request.')
+        if row['status'] == ServiceRequest.STATUS_COMPLETED:
+            raise _invalid('Completed requests cannot be cancelled.')
+
+
+TRANSITIONS = {transition.name: transition for transition in (Accept(), Reject(), Finish(), Cancel())}
+
+EXPLAIN_FIELDS = ('pk', 'client_id', 'provider_id', 'status', 'service_type_id')
+
+
+def _to_pk(pk):
+    try:
+        return ServiceRequest._meta.pk.to_python(pk)
+    except ValidationError:
+        raise NotFound()
+
+
+def _load_row(queryset, pk):
+    row = queryset.filter(pk=pk).values(*EXPLAIN_FIELDS).first()
+    if row is None:
+        raise NotFound()
+    return row
+
+
+def apply(name, pk, actor, queryset):
+    """Run transition ``name`` on service request ``pk`` for ``actor`` (an ``app.actor.Actor``).
+
+    ``queryset`` holds the requests the actor can see. Returns the primary
+    key of the updated request; raises ``TransitionError`` (or ``NotFound``)
+    when the transition does not apply.
+    """
+    transition = TRANSITIONS[name]
+    pk = _to_pk(pk)
+
+    # a request the actor cannot see is a 404 before anything else
+    row = _load_row(queryset, pk)
+    transition.authorize(actor)
+    transition.check(row, actor)
+    values = transition.values(actor)
+    updated = ServiceRequest.objects.filter(
+        transition.guard(actor), pk=pk,
+    ).update(**values)
+    if updated:
+        # the workload of the provider it was and is assigned to
+        matching.providers_changed([row['provider_id'], values.get('provider_id')])
+        if transition.status == ServiceRequest.STATUS_PENDING:
+            events.publish_open_jobs([pk])
+        return pk
+    transition.explain(_load_row(queryset, pk), actor)
+
+
+def apply_many(name, pks, actor, queryset):
+    """Run transition ``name`` on every service request in ``pks`` at once.
+
+    The rows are locked and checked against the transition's guard in one
+    SELECT, and all those that pass are changed by one UPDATE, in a single
+    transaction. Returns ``{pk: error}`` for the requests left unchanged,
+    where ``error`` is the ``TransitionError`` (or ``NotFound``) the single
+    transition would have raised; as there, ``queryset`` holds the requests
+    the actor can see. Raises when the actor may not attempt the
+    transition at all.
+    """
+    transition = TRANSITIONS[name]
+    transition.authorize(actor)
+
+    errors = {}
+    with transaction.atomic():
+        guard = transition.guard(actor)
+        rows = (
+            queryset.select_for_update()
+            .filter(pk__in=pks)
+            .annotate(allowed=ExpressionWrapper(guard, output_field=BooleanField()))
+            .values(*EXPLAIN_FIELDS, 'allowed')
+        )
+        rows = {row['pk']: row for row in rows}
+        allowed = [pk for pk, row in rows.items() if row['allowed']]
+        for pk in pks:
+            if pk not in rows:
+                errors[pk] = NotFound()
+            elif not rows[pk]['allowed']:
+                try:
+                    transition.explain(rows[pk], actor)
+                except APIException as exc:
+                    errors[pk] = exc
+        if allowed:
+            values = transition.values(actor)
+            updated = ServiceRequest.objects.filter(guard, pk__in=allowed).update(**values)
+            if updated != len(allowed):
+                # only possible where the backend ignores select_for_update
+                raise _conflict('Some of these service requests changed, try again.')
+            matching.providers_changed([rows[pk]['provider_id'] for pk in allowed] + [values.get('provider_id')])
+            if transition.status == ServiceRequest.STATUS_PENDING:
+                events.publish_open_jobs(allowed)
+    return errors
@@ -6,41 +6,70 @@ from .serializers import (
     ServiceRequestDetailSerializer,
     ServiceRequestCreateUpdateSerializer,
     RatingSerializer,
+    BulkTransitionSerializer,
 )
 from app.permissions import IsOwnerOrReadOnly
-from django.db import transaction
-
-
-class ServiceRequestViewSet(viewsets.ModelViewSet):
+from app.actor import get_actor
+from app.conditional import ConditionalGetMixin
+from app.prefetch import PrefetchMixin, prefetch_for_serializer
+from app.projection import ProjectionMixin, paginated_response
+from app.search import SearchPagination
+from app.sparse import SparseFieldsetMixin, sparse_serializer_class
+from app import geo
+from .pagination import ServiceRequestPagination
+from services.catalog import get_catalog
+from . import events, export, matching, transitions
+from providers.models import Provider
+from providers.serializers import ProviderSerializer
+from rest_framework.pagination import _positive_int
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+
+
+class ServiceRequestViewSet(ConditionalGetMixin, SparseFieldsetMixin, ProjectionMixin, PrefetchMixin, viewsets.ModelViewSet):
     queryset = ServiceRequest.objects.all()
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    pagination_class = ServiceRequestPagination
+    # the payload shows the provider (and its stars), the client (also the
+    # rating's reviewer) and the service type name
+    version_fields = ('updated_at', 'provider__updated_at', 'client__updated_at')
+    serializer_class = ServiceRequestDetailSerializer
+
+    def get_version_salt(self):
+        return get_catalog().etag
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return ServiceRequestCreateUpdateSerializer
-        return ServiceRequestDetailSerializer
+        return super().get_serializer_class()
     
     def perform_create(self, serializer):
-        serializer.save(client=self.request.user)
+        service_request = serializer.save(client=self.request.user)
+        events.publish_open_jobs([service_request.pk])
 
     def get_queryset(self):
-        user = self.request.user
-        if user.is_authenticated and user.is_staff:
+        actor = get_actor(self.request)
+        if actor.is_staff:
             return ServiceRequest.objects.all()
-        if user.is_authenticated:
-            provider = getattr(user, 'provider_profile', None)
-            if provider:
-                from django.db.models import Q
-
-                return ServiceRequest.objects.filter(
-                    Q(service_type__in=provider.service_types.all(), status=ServiceRequest.STATUS_PENDING) |
-                    Q(provider=provider)
-                ).distinct()
-            
-            return ServiceRequest.objects.filter(client=user)
+        if actor.is_provider:
+            if self.action == 'list':
+                # read only the requested page window from each feed branch
+                position, reverse = self.paginator.decode_cursor(self.request, ServiceRequest.objects.all())
+                return ServiceRequest.objects.provider_feed(
+                    actor.provider_id, actor.service_type_ids,
+                    limit=self.paginator.get_page_size(self.request) + 1,
+                    position=position, reverse=reverse,
+                )
+            return ServiceRequest.objects.provider_feed(actor.provider_id, actor.service_type_ids)
+        if actor.is_authenticated:
+            return ServiceRequest.objects.filter(client_id=actor.user_id)
 
         return ServiceRequest.objects.none()
 
+    def _reload(self, pk):
+        queryset = prefetch_for_serializer(ServiceRequest.objects.all(), ServiceRequestDetailSerializer)
+        return queryset.get(pk=pk)
+
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def rate(self, request, pk=None):
         """Allow the client who created the service request to rate the assigned provider after completion."""
@@ -65,57 +94,22 @@ class ServiceRequestViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def _transition(self, request, name, pk):
+        pk = transitions.apply(name, pk, get_actor(request), self.get_queryset())
+        serializer = ServiceRequestDetailSerializer(self._reload(pk), context={'request': request})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def accept(self, request, pk=None):
         """Allow a provider (authenticated user with Provider profile) to accept a pending service request.
 
         Conditions:
         - Request must be PENDING
-        - Request must not already have a provider
+        - Request must not already have a provider (409 if another provider got it first)
         - Provider must offer the ServiceRequest.service_type
         - Provider cannot be the client
         """
-        service_request = self.get_object()
-        user = request.user
-
-        provider = getattr(user, 'provider_profile', None)
-        if not provider:
-            return Response({'detail': 'Only providers can accept service requests.'}, status=status.HTTP_403_FORBIDDEN)
-
-        if service_request.client == user:
-            return Response({'detail': 'Client cannot accept their own request.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if service_request.status != ServiceRequest.STATUS_PENDING:
-            return Response({'detail': 'Only pending requests can be accepted.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if service_request.provider is not None:
-                if service_request.provider == provider:
-                    # If status is still pending, update to IN_PROGRESS
-                    if service_request.status == ServiceRequest.STATUS_PENDING:
-                        with transaction.atomic():
-                            sr = ServiceRequest.objects.select_for_update().get(pk=service_request.pk)
-                            sr.status = ServiceRequest.STATUS_IN_PROGRESS
-                            sr.save(update_fields=['status', 'completion_date'])
-                        sr.refresh_from_db()
-                        serializer = ServiceRequestDetailSerializer(sr, context={'request': request})
-                        return Response(serializer.data, status=status.HTTP_200_OK)
-                    serializer = ServiceRequestDetailSerializer(service_request, context={'request': request})
-                    return Response(serializer.data, status=status.HTTP_200_OK)
-                return Response({'detail': 'This service request already has a provider.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if service_request.service_type not in provider.service_types.all():
-            return Response({'detail': 'Provider does not offer this type of service.'}, status=status.HTTP_403_FORBIDDEN)
-
-        with transaction.atomic():
-            sr = ServiceRequest.objects.select_for_update().get(pk=service_request.pk)
-            sr.provider = provider
-            sr.status = ServiceRequest.STATUS_IN_PROGRESS
-            sr.save(update_fields=['provider', 'status', 'completion_date'])
-
-        sr.refresh_from_db()
-
-        serializer = ServiceRequestDetailSerializer(sr, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self._transition(request, 'accept', pk)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def reject(self, request, pk=None):
@@ -126,77 +120,141 @@ class ServiceRequestViewSet(viewsets.ModelViewSet):
           unassign the provider and set status back to PENDING so others can accept.
         - If the request is not assigned to the current provider, return 400/403 accordingly.
         """
-        service_request = self.get_object()
-        user = request.user
-
-        provider = getattr(user, 'provider_profile', None)
-        if not provider:
-            return Response({'detail': 'Only providers can reject service requests.'}, status=status.HTTP_403_FORBIDDEN)
-
-        if service_request.status == ServiceRequest.STATUS_COMPLETED:
-            return Response({'detail': 'Completed requests cannot be rejected.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if service_request.provider is None:
-            return Response({'detail': 'This service request has no assigned provider to reject.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if service_request.provider != provider:
-            return Response({'detail': 'You are not the assigned provider for this request.'}, status=status.HTTP_403_FORBIDDEN)
-
-        # Unassign provider and revert status to pending so other providers can accept
-        with transaction.atomic():
-            sr = ServiceRequest.objects.select_for_update().get(pk=service_request.pk)
-            sr.provider = None
-            sr.status = ServiceRequest.STATUS_PENDING
-            sr.save(update_fields=['provider', 'status', 'completion_date'])
-
-        sr.refresh_from_db()
-        serializer = ServiceRequestDetailSerializer(sr, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self._transition(request, 'reject', pk)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def finish(self, request, pk=None):
         """Allow the assigned provider to mark an IN_PROGRESS request as COMPLETED."""
-        service_request = self.get_object()
-        user = request.user
-
-        provider = getattr(user, 'provider_profile', None)
-        if not provider:
-            return Response({'detail': 'Only providers can finish service requests.'}, status=status.HTTP_403_FORBIDDEN)
-
-        if service_request.provider != provider:
-            return Response({'detail': 'You are not the assigned provider for this request.'}, status=status.HTTP_403_FORBIDDEN)
+        return self._transition(request, 'finish', pk)
 
-        if service_request.status != ServiceRequest.STATUS_IN_PROGRESS:
-            return Response({'detail': 'Only in-progress requests can be finished.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        with transaction.atomic():
-            sr = ServiceRequest.objects.select_for_update().get(pk=service_request.pk)
-            sr.status = ServiceRequest.STATUS_COMPLETED
-            sr.save(update_fields=['status', 'completion_date'])
-        sr.refresh_from_db()
-        serializer = ServiceRequestDetailSerializer(sr, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
-    
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def cancel(self, request, pk=None):
         """Allow the client or assigned provider to cancel a service request (if not completed)."""
-        service_request = self.get_object()
-        user = request.user
-
-        provider = getattr(user, 'provider_profile', None)
-        is_client = service_request.client == user
-        is_provider = provider and service_request.provider == provider
-
-        if not (is_client or is_provider):
-            return Response({'detail': 'Only the client or assigned provider can cancel this request.'}, status=status.HTTP_403_FORBIDDEN)
+        return self._transition(request, 'cancel', pk)
 
-        if service_request.status == ServiceRequest.STATUS_COMPLETED:
-            return Response({'detail': 'Completed requests cannot be cancelled.'}, status=status.HTTP_400_BAD_REQUEST)
+    @action(detail=False, methods=['post'], url_path='bulk-transition', permission_classes=[permissions.IsAuthenticated])
+    def bulk_transition(self, request):
+        """Apply accept/reject/finish/cancel to up to 100 service requests at once.
 
-        with transaction.atomic():
-            sr = ServiceRequest.objects.select_for_update().get(pk=service_request.pk)
-            sr.status = ServiceRequest.STATUS_CANCELLED
-            sr.save(update_fields=['status'])
-        sr.refresh_from_db()
-        serializer = ServiceRequestDetailSerializer(sr, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        Body: ``{"ids": [1, 2, 3], "action": "accept"}``. The same rules as the
+        single actions apply to each request; every change that passes them is
+        applied in one transaction. Responds 200 with one result per id, in the
+        order given: ``{"id", "ok": true, "status"}`` or
+        ``{"id", "ok": false, "status_code", "detail"}``.
+        """
+        serializer = BulkTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        name = serializer.validated_data['action']
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+
+        errors = transitions.apply_many(name, ids, get_actor(request), self.get_queryset())
+        new_status = transitions.TRANSITIONS[name].status
+        results = []
+        for pk in ids:
+            error = errors.get(pk)
+            if error is None:
+                results.append({'id': pk, 'ok': True, 'status': new_status})
+            else:
+                results.append({'id': pk, 'ok': False, 'status_code': error.status_code, 'detail': error.detail})
+        return Response({'action': name, 'results': results}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def search(self, request):
+        """Requests whose title or description match ``?q=``, best match first.
+
+        Searches the requests the user can list: all for staff, the job
+        feed for providers, their own for clients. Keyset-paginated on the
+        rank; ``?fields=``/``?expand=`` apply.
+        """
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            raise ValidationError({'q': 'Enter the words to search for.'})
+        queryset = ServiceRequest.search_index.search(self.get_queryset(), text)
+        serializer_class = sparse_serializer_class(ServiceRequestDetailSerializer, request)
+        return paginated_response(queryset, serializer_class, SearchPagination(), request, self)
+
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def candidates(self, request, pk=None):
+        """Best providers for this request, from the in-memory ranking index (staff or the client).
+
+        ``?limit=`` sets how many (default 10, at most 50). Each result has
+        the provider, its ``score`` and the numbers behind it.
+        """
+        service_request = self.get_object()
+        actor = get_actor(request)
+        if not actor.is_staff and service_request.client_id != actor.user_id:
+            return Response({'detail': 'Only the requester can see the candidates.'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            limit = _positive_int(request.query_params.get('limit', 10), strict=True, cutoff=50)
+        except ValueError:
+            raise ValidationError({'limit': 'Use a positive integer.'})
+
+        states = matching.top_candidates(service_request, limit)
+        providers = prefetch_for_serializer(Provider.objects.filter(pk__in=[state.provider_id for state in states]), ProviderSerializer)
+        data = {provider.pk: ProviderSerializer(provider, context={'request': request}).data for provider in providers}
+        results = [
+            {
+                'provider': data[state.provider_id],
+                'score': round(state.score, 4),
+                'in_progress': state.in_progress,
+                'completed': state.completed,
+            }
+            for state in states
+            # a provider deleted since the index last synced
+            if state.provider_id in data
+        ]
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def nearby(self, request):
+        """Open jobs of the provider's service types within ``?km=`` (default 10, at most 100), nearest first.
+
+        Distances are from ``?lat=&lon=`` or, without them, from the
+        provider's own location. ``?limit=`` caps the results (default 20,
+        at most 100); each has the request and its ``distance_km``.
+        """
+        actor = get_actor(request)
+        if not actor.is_provider:
+            return Response({'detail': 'Only providers have a job feed.'}, status=status.HTTP_403_FORBIDDEN)
+        latitude, longitude = geo.origin(request, request.user)
+        km = geo.radius(request, default=10, cutoff=100)
+        try:
+            limit = _positive_int(request.query_params.get('limit', 20), strict=True, cutoff=100)
+        except ValueError:
+            raise ValidationError({'limit': 'Use a positive integer.'})
+
+        found = ServiceRequest.objects.open_near(latitude, longitude, km, actor.service_type_ids, limit)
+        serializer_class = sparse_serializer_class(ServiceRequestDetailSerializer, request)
+        queryset = prefetch_for_serializer(ServiceRequest.objects.filter(pk__in=[pk for _, pk in found]), serializer_class)
+        service_requests = {service_request.pk: service_request for service_request in queryset}
+        context = self.get_serializer_context()
+        results = [
+            {**serializer_class(service_requests[pk], context=context).data, 'distance_km': round(distance, 3)}
+            for distance, pk in found
+            if pk in service_requests
+        ]
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='export', permission_classes=[permissions.IsAdminUser])
+    def export_all(self, request):
+        """Stream all service requests, with rating, provider and service type, for analytics (admin only).
+
+        Query params: ``output`` -- ``ndjson`` (default, one JSON object per
+        line) or ``csv``; ``since`` -- ISO 8601 date or datetime, keeps the
+        rows whose ``updated_at`` is at or after it. Rows are ordered by
+        ``updated_at``, so the last one gives the next ``since``.
+        """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in export.OUTPUTS:
+            raise ValidationError({'output': f'Use one of: {", ".join(export.OUTPUTS)}.'})
+        since = request.query_params.get('since')
+        if since is not None:
+            try:
+                since = export.parse_since(since)
+            except ValueError:
+                raise ValidationError({'since': 'Use an ISO 8601 date or datetime.'})
+        response = StreamingHttpResponse(
+            export.buffered(export.render(export.export_rows(since), output)), content_type=export.CONTENT_TYPES[output],
+        )
+        response['Content-Disposition'] = f'attachment; filename="service-requests.{output}"'
+        return response
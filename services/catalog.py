@@ -0,0 +1,81 @@
+"""In-process cache of the service-type catalog.
+
+The catalog is small and almost never changes, so each process keeps one
+snapshot of it: the rows, the list response pre-rendered as JSON bytes and an
+ETag of those bytes. The snapshot is tagged with a version kept in the
+Django cache; ``bump_catalog_version`` (called on every save/delete of a
+``ServiceType``) replaces it, and every process rebuilds its snapshot on the
+next read. That only reaches other processes through a shared cache, so a
+snapshot is also re-read once it is ``SERVICE_TYPE_CATALOG_MAX_AGE`` seconds
+old: with the default local-memory cache, that is how long another worker can
+serve an outdated catalog.
+"""
+import hashlib
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from app.renderers import ORJSONRenderer
+
+VERSION_KEY = 'services:catalog:version'
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+class Catalog:
+    def __init__(self, version, data):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.data = data
+        self.by_id = {row['id']: row for row in data}
+        self.json = ORJSONRenderer().render(data)
+        self.etag = '"%s"' % hashlib.sha1(self.json).hexdigest()
+
+    def is_current(self, version):
+        return self.version == version and time.monotonic() - self.loaded_at < settings.SERVICE_TYPE_CATALOG_MAX_AGE
+
+    def __contains__(self, pk):
+        return pk in self.by_id
+
+    def instance(self, pk):
+        """A ``ServiceType`` for ``pk`` built from the snapshot (no query), or None."""
+        from .models import ServiceType
+        row = self.by_id.get(pk)
+        if row is None:
+            return None
+        return ServiceType.from_db('default', list(row), list(row.values()))
+
+
+def catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # random, so a version lost from the cache never matches an old one
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    global _snapshot
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    _snapshot = None
+
+
+def get_catalog():
+    """The current catalog snapshot, rebuilt from the database when stale."""
+    global _snapshot
+    version = catalog_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.is_current(version):
+        return snapshot
+    from .models import ServiceType
+    from .serializers import ServiceTypeSerializer
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is None or not snapshot.is_current(version):
+            data = ServiceTypeSerializer(ServiceType.objects.order_by('pk'), many=True).data
+            snapshot = _snapshot = Catalog(version, [dict(row) for row in data])
+    return snapshot
@@ -4,5 +4,12 @@ from django.db import models
 class ServiceType(models.Model):
     name = models.CharField(max_length=100)
 
+    # columns read by __str__, used by app.projection
+    str_fields = ('name',)
+
+    @staticmethod
+    def str_from_values(name):
+        return name
+
     def __str__(self):
         return self.name
\ No newline at end of file
@@ -1,8 +1,38 @@
 from rest_framework import serializers
+from .catalog import get_catalog
 from .models import ServiceType
 
 
 class ServiceTypeSerializer(serializers.ModelSerializer):
     class Meta:
         model = ServiceType
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class CatalogServiceTypeField(serializers.PrimaryKeyRelatedField):
+    """``PrimaryKeyRelatedField`` for service types validated against the
+    in-process catalog (``services.catalog``) instead of a query per id.
+
+    Only ids missing from the snapshot are looked up in the database."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('queryset', ServiceType.objects.all())
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if self.pk_field is not None:
+            pk = self.pk_field.to_internal_value(data)
+        elif isinstance(data, int) and not isinstance(data, bool):
+            pk = data
+        elif isinstance(data, str) and data.isascii() and data.isdigit():
+            pk = int(data)
+        else:
+            # floats such as 1.9 included, which int() would truncate
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        instance = get_catalog().instance(pk)
+        if instance is None:
+            # the snapshot may predate a type added through another process
+            instance = self.get_queryset().filter(pk=pk).first()
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        return instance
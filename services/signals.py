@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .catalog import bump_catalog_version
+from .models import ServiceType
+
+
+@receiver([post_save, post_delete], sender=ServiceType)
+def service_type_changed(sender, instance, **kwargs):
+    bump_catalog_version()
+    # again once committed, so a snapshot rebuilt from the pre-commit rows
+    # is not kept under the new version
+    transaction.on_commit(bump_catalog_version)
@@ -1,12 +1,42 @@
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response
 from rest_framework import viewsets, permissions
+from rest_framework.response import Response
+from .catalog import get_catalog
 from .models import ServiceType
 from .serializers import ServiceTypeSerializer
 
 class ServiceTypeViewSet(viewsets.ModelViewSet):
     queryset = ServiceType.objects.all()
     serializer_class = ServiceTypeSerializer
+    # small catalog, always returned whole
+    pagination_class = None
 
     def get_permissions(self):
         if self.request.method == 'POST':
             return [permissions.IsAdminUser()]
         return [permissions.IsAuthenticatedOrReadOnly()]
+
+    def list(self, request, *args, **kwargs):
+        # served from the in-process catalog, already rendered, with an ETag
+        catalog = get_catalog()
+        response = get_conditional_response(request._request, etag=catalog.etag)
+        if response is None:
+            if request.accepted_renderer.format == 'json':
+                response = HttpResponse(catalog.json, content_type='application/json')
+            else:
+                response = Response(catalog.data)
+        response['ETag'] = catalog.etag
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        row = get_catalog().by_id.get(self._catalog_pk())
+        if row is None:
+            raise Http404
+        return Response(row)
+
+    def _catalog_pk(self):
+        try:
+            return int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except (TypeError, ValueError):
+            raise Http404
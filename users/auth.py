@@ -1,23 +1,48 @@
-from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
-from .serializers import UserSerializer
+from .authentication import claims_version
 
 User = get_user_model()
 
 
+def add_actor_claims(token, user):
+    """Put the user's provider identity on ``token``.
+
+    ``is_provider``, ``provider_id``, ``provider_is_active`` and
+    ``service_type_ids`` let views skip the provider lookups; ``ver`` tags the
+    provider row they were read from (``users.authentication.claims_version``),
+    so a stale snapshot can be detected. ``user.provider_profile`` should
+    already be loaded.
+    """
+    provider = getattr(user, 'provider_profile', None)
+    token['is_provider'] = provider is not None
+    token['provider_id'] = provider.pk if provider is not None else None
+    token['provider_is_active'] = provider is not None and provider.is_active
+    token['service_type_ids'] = sorted(provider.service_types.values_list('pk', flat=True)) if provider is not None else []
+    token['ver'] = claims_version(user)
+    return token
+
+
 class EmailTokenObtainPairSerializer(serializers.Serializer):
     """Obtain JWT tokens using email + password instead of username.
 
-    This serializer looks up the user by `email` and then authenticates
-    using the user's internal `username` so the default auth backend
-    continues to work.
+    The user (with its provider profile) is looked up once by email through
+    the ``lower(email)`` index and the password checked on that instance,
+    instead of going through ``authenticate()``, which would look the user
+    up again by username.
     """
 
     email = serializers.EmailField(write_only=True)
     password = serializers.CharField(write_only=True)
 
+    no_active_account_message = 'No active account found with the given credentials'
+
+    @classmethod
+    def get_token(cls, user):
+        return add_actor_claims(RefreshToken.for_user(user), user)
+
     def validate(self, attrs):
         email = attrs.get('email')
         password = attrs.get('password')
@@ -25,18 +50,18 @@ class EmailTokenObtainPairSerializer(serializers.Serializer):
         if not email or not password:
             raise serializers.ValidationError({'detail': 'Must include "email" and "password".'})
 
-        try:
-            user_obj = User.objects.get(email__iexact=email)
-        except User.DoesNotExist:
-            raise serializers.ValidationError({'detail': 'No active account found with the given credentials'})
+        users = list(User.filter_by_email(email).select_related('provider_profile')[:2])
+        if len(users) != 1:
+            # hash anyway so unknown emails take as long as wrong passwords
+            User().set_password(password)
+            raise serializers.ValidationError({'detail': self.no_active_account_message})
+        user = users[0]
 
-        user = authenticate(username=user_obj.username, password=password)
-        if user is None:
-            raise serializers.ValidationError({'detail': 'No active account found with the given credentials'})
-        if not user.is_active:
-            raise serializers.ValidationError({'detail': 'User is inactive'})
+        if not user.check_password(password) or not user.is_active:
+            raise serializers.ValidationError({'detail': self.no_active_account_message})
 
-        refresh = RefreshToken.for_user(user)
+        self.user = user
+        refresh = self.get_token(user)
         return {
             'refresh': str(refresh),
             'access': str(refresh.access_token),
@@ -48,22 +73,15 @@ class CustomTokenObtainPairSerializer(EmailTokenObtainPairSerializer):
     """
     def validate(self, attrs):
         data = super().validate(attrs)
-        
-        email = attrs.get('email')
-        try:
-            user = User.objects.get(email__iexact=email)
-        except User.DoesNotExist:
-            return data
+        user = self.user
 
-        user_data = UserSerializer(user).data
-        
         data['user_id'] = user.pk
         data['email'] = user.email
         data['first_name'] = user.first_name
         data['last_name'] = user.last_name
-        data['phone_number'] = user_data.get('phone_number', '')
+        data['phone_number'] = user.phone_number
 
         return data
 
 class EmailTokenObtainPairView(TokenObtainPairView):
-    serializer_class = CustomTokenObtainPairSerializer
\ No newline at end of file
+    serializer_class = CustomTokenObtainPairSerializer
@@ -0,0 +1,175 @@
+"""JWT authentication with a per-process user cache.
+
+``CachedJWTAuthentication`` resolves the token's user (with its provider
+profile) from a bounded LRU cache in each process instead of running a
+SELECT on every request. Each cached user is tagged with a per-user version
+kept in the Django cache (``USER_CACHE_ALIAS``); ``invalidate_user`` replaces
+it whenever the user or its provider profile changes, so every process
+drops its copy on its next request, and entries also expire after
+``USER_CACHE_TTL`` seconds. With a shared Django cache (Redis, memcached)
+the version check is one cache round trip and still no database query. With
+the default local-memory one the version only changes in the process that
+made the change; the others keep serving their copy until it expires, so
+``USER_CACHE_TTL`` is how long a deactivation, a password change or a new
+role can take to reach them.
+
+The actor claims of a token are checked against ``claims_version``, which
+is read from the provider row loaded with the user, so whether they are
+current does not depend on the cache at all.
+"""
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from app.actor import Actor
+
+
+def _version_cache():
+    return caches[getattr(settings, 'USER_CACHE_ALIAS', 'default')]
+
+
+def _version_key(user_id):
+    return f'users:version:{user_id}'
+
+
+def user_version(user_id):
+    """Opaque tag that changes whenever ``user_id`` is invalidated."""
+    cache = _version_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # random rather than a counter: a version lost from the cache
+        # (eviction, restart) must not come back equal to an old one
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def claims_version(user):
+    """Tag of the actor claims of ``user`` (loaded with its ``provider_profile``).
+
+    The provider's primary key and ``updated_at``, which any change to its
+    active flag or service types moves.
+    """
+    provider = getattr(user, 'provider_profile', None)
+    if provider is None:
+        return 'none'
+    return f'{provider.pk}:{provider.updated_at.isoformat()}'
+
+
+def invalidate_user(user_id):
+    """Make every process reload ``user_id`` on its next request."""
+    _version_cache().set(_version_key(user_id), uuid.uuid4().hex, timeout=None)
+    user_cache.discard(user_id)
+
+
+def invalidate_users(user_ids):
+    """``invalidate_user`` for many users, with one cache write."""
+    _version_cache().set_many({_version_key(user_id): uuid.uuid4().hex for user_id in user_ids}, timeout=None)
+    for user_id in user_ids:
+        user_cache.discard(user_id)
+
+
+class UserCache:
+    """Bounded LRU of ``user_id -> (version, expires_at, user)`` entries."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, version):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            cached_version, expires_at, user = entry
+            if cached_version != version or expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, version, user):
+        with self._lock:
+            self._entries[user_id] = (version, time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(
+    maxsize=getattr(settings, 'USER_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'USER_CACHE_TTL', 60),
+)
+
+
+def _copy_user(user):
+    # each request gets its own instances, so nothing it sets on them leaks
+    # into the cache or into other threads
+    user = copy.copy(user)
+    provider = user._state.fields_cache.get('provider_profile')
+    if provider is not None:
+        provider = copy.copy(provider)
+        provider._state.fields_cache['user'] = user
+        user._state.fields_cache['provider_profile'] = provider
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that serves users from ``user_cache``.
+
+    The user is loaded with ``select_related('provider_profile')`` so
+    ``request.user.provider_profile`` costs no query either, and cached
+    together with its ``app.actor.Actor`` (``user.actor``). The actor comes
+    from the token claims when their ``ver`` matches the loaded rows
+    (``claims_version``), and from one joined query otherwise.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from e
+
+        version = user_version(user_id)
+        user = user_cache.get(user_id, version)
+        if user is None:
+            try:
+                user = self.user_model.objects.select_related('provider_profile').get(
+                    **{api_settings.USER_ID_FIELD: user_id}
+                )
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found') from e
+            actor = None
+            if validated_token.get('ver') == claims_version(user):
+                actor = Actor.from_claims(user, validated_token)
+            user.actor = actor or Actor.for_user(user)
+            user_cache.set(user_id, version, user)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        return _copy_user(user)
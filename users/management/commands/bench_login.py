@@ -0,0 +1,96 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import authenticate, get_user_model
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from providers.models import Provider
+from services.models import ServiceType
+from users.auth import CustomTokenObtainPairSerializer
+from users.serializers import UserSerializer
+import random
+import statistics
+import time
+
+User = get_user_model()
+
+
+def legacy_login(email, password):
+    """The login flow as it was before the single lookup (three lookups + authenticate)."""
+    user_obj = User.objects.get(email__iexact=email)
+    user = authenticate(username=user_obj.username, password=password)
+    if user is None:
+        return None
+    refresh = RefreshToken.for_user(user)
+    data = {'refresh': str(refresh), 'access': str(refresh.access_token)}
+    user = User.objects.get(email__iexact=email)
+    data['phone_number'] = UserSerializer(user).data.get('phone_number', '')
+    return data
+
+
+def new_login(email, password):
+    serializer = CustomTokenObtainPairSerializer(data={'email': email, 'password': password})
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the login (token obtain) flow: legacy lookups vs single indexed lookup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50_000, help='Number of users to generate (default: 50000)')
+        parser.add_argument('--logins', type=int, default=500, help='Timed logins per flow (default: 500)')
+        parser.add_argument('--real-hasher', action='store_true', help='Keep the configured password hasher (login time is then dominated by hashing)')
+
+    def handle(self, *args, **options):
+        hashers = None if options['real_hasher'] else ['django.contrib.auth.hashers.MD5PasswordHasher']
+        # Everything runs inside a transaction that is rolled back at the end,
+        # so the benchmark never leaves data behind.
+        with override_settings(**({'PASSWORD_HASHERS': hashers} if hashers else {})):
+            with transaction.atomic():
+                emails = self._seed(options)
+                self._run(emails, options)
+                transaction.set_rollback(True)
+
+    def _seed(self, options):
+        password = User(username='bench-login-password')
+        password.set_password('bench-password')
+        self.stdout.write(f'Generating {options["users"]} users...')
+        users = User.objects.bulk_create([
+            User(username=f'bench-login-{i}', email=f'Bench.Login.{i}@Example.com', password=password.password)
+            for i in range(options['users'])
+        ], batch_size=5000)
+        if users and users[0].pk is None:
+            users = list(User.objects.filter(username__startswith='bench-login-').order_by('pk'))
+        service_type = ServiceType.objects.create(name='bench-login')
+        # every tenth user is a provider, so the claims are exercised too
+        providers = Provider.objects.bulk_create([
+            Provider(user=user, cpf_cnpj=f'bench-login-{i}') for i, user in enumerate(users[::10])
+        ])
+        if providers and providers[0].pk is None:
+            providers = list(Provider.objects.filter(cpf_cnpj__startswith='bench-login-'))
+        Provider.service_types.through.objects.bulk_create([
+            Provider.service_types.through(provider_id=provider.pk, servicetype_id=service_type.pk) for provider in providers
+        ])
+        rng = random.Random(42)
+        # log in with a different case than stored, like users do
+        return [users[rng.randrange(len(users))].email.lower() for _ in range(options['logins'])]
+
+    def _run(self, emails, options):
+        for label, login in (('legacy (iexact x3 + authenticate)', legacy_login), ('single lower(email) lookup', new_login)):
+            timings = []
+            queries = []
+
+            def counter(execute, sql, params, many, context):
+                queries.append(sql)
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(counter):
+                for email in emails:
+                    started = time.perf_counter()
+                    login(email, 'bench-password')
+                    timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f'{label:36} {len(emails) / (sum(timings) / 1000):8.1f} logins/s  '
+                f'median {statistics.median(timings):6.2f} ms  '
+                f'{len(queries) / len(emails):.1f} queries/login'
+            )
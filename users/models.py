@@ -1,13 +1,53 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser
+from django.core.validators import MinValueValidator, MaxValueValidator
+from app import geo
 
 class CustomUser(AbstractUser):
     phone_number = models.CharField(max_length=15, blank=True, null=True)
     address = models.CharField(max_length=255, blank=True, null=True)
+    # located from the address (app.geo); geohash indexes the point
+    latitude = models.FloatField(null=True, blank=True, validators=[geo.validate_finite, MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[geo.validate_finite, MinValueValidator(-180), MaxValueValidator(180)])
+    geohash = models.CharField(max_length=12, null=True, blank=True, editable=False)
     birth_date = models.DateField(blank=True, null=True)
     is_provider = models.BooleanField(default=False)
     profile_image = models.ImageField(upload_to='users/profile_images/', blank=True, null=True)
+    # bumped by every change to the user (conditional GET of payloads showing them)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # case-insensitive login lookup, see CustomUser.filter_by_email()
+            models.Index(Lower('email'), name='user_email_lower_idx'),
+            # users (providers) near a point, see app.geo.cover()
+            models.Index(fields=['geohash'], name='user_geohash_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # auto_now only writes updated_at when it is among update_fields
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'updated_at' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'updated_at']
+        super().save(*args, **geo.set_geohash(self, kwargs))
+
+    @classmethod
+    def filter_by_email(cls, email):
+        """Users whose email matches ``email`` ignoring case, via the ``lower(email)`` index.
+
+        ``email__iexact`` compiles to ``UPPER(...)`` on PostgreSQL and ``LIKE``
+        on SQLite, neither of which can use the index.
+        """
+        return cls.objects.annotate(email_lower=Lower('email')).filter(email_lower=email.lower())
+
+    # columns read by __str__, used by app.projection
+    str_fields = ('first_name', 'last_name', 'email', 'username')
+
+    @staticmethod
+    def str_from_values(first_name, last_name, email, username):
+        full_name = f"{first_name} {last_name}".strip()
+        return full_name if full_name else email or username
 
     def __str__(self):
-        full_name = f"{self.first_name} {self.last_name}".strip()
-        return full_name if full_name else self.email or self.username
\ No newline at end of file
+        return self.str_from_values(self.first_name, self.last_name, self.email, self.username)
\ No newline at end of file
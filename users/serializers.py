@@ -1,16 +1,32 @@
 from rest_framework import serializers
+from app import geo
 from .models import CustomUser
 from uuid import uuid4
 
 
+class PublicUserSerializer(serializers.ModelSerializer):
+    """What other users may see of an account (used by ``?expand=``)."""
+
+    class Meta:
+        model = CustomUser
+        fields = ['id', 'first_name', 'last_name']
+        read_only_fields = fields
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
-        fields = ['id', 'first_name', 'last_name', 'password', 'email', 'phone_number', 'address', 'birth_date', 'profile_image', 'is_provider']
+        fields = ['id', 'first_name', 'last_name', 'password', 'email', 'phone_number', 'address', 'latitude', 'longitude', 'birth_date', 'profile_image', 'is_provider']
         extra_kwargs = {
             'password': {'write_only': True}
         }
 
+    def validate(self, attrs):
+        return geo.validate_point(attrs)
+
+    def update(self, instance, validated_data):
+        return super().update(instance, geo.locate(validated_data))
+
     def create(self, validated_data):
 
         password = validated_data.pop('password', None)
@@ -27,6 +43,6 @@ class UserSerializer(serializers.ModelSerializer):
             i += 1
             username = f"{base_username}{i}"
 
-        user = CustomUser.objects.create_user(username=username, email=email, password=password, **validated_data)
+        user = CustomUser.objects.create_user(username=username, email=email, password=password, **geo.locate(validated_data))
         
         return user
\ No newline at end of file
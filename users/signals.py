@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from providers.models import Provider
+from .authentication import invalidate_user
+
+
+def _invalidate(user_id):
+    invalidate_user(user_id)
+    # again once the change is visible: a request that reloads the user
+    # before the commit would otherwise cache the old row under the new
+    # version
+    transaction.on_commit(lambda: invalidate_user(user_id))
+
+
+@receiver([post_save, post_delete], sender=get_user_model())
+def user_changed(sender, instance, **kwargs):
+    _invalidate(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Provider)
+def provider_changed(sender, instance, **kwargs):
+    _invalidate(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Provider.service_types.through)
+def provider_service_types_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # the offered service types are part of the token claims
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        _invalidate(instance.user_id)
+    elif pk_set:
+        for user_id in Provider.objects.filter(pk__in=pk_set).values_list('user_id', flat=True):
+            _invalidate(user_id)
@@ -6,6 +6,10 @@ from rest_framework.decorators import action
 from .models import CustomUser
 from .serializers import UserSerializer
 from app.permissions import IsOwnerOrReadOnly
+from app.prefetch import PrefetchMixin
+from app.projection import ProjectionMixin, paginated_response
+from app.sparse import SparseFieldsetMixin, sparse_serializer_class
+from .authentication import invalidate_user
 
 
 class CurrentUserView(APIView):
@@ -15,7 +19,7 @@ class CurrentUserView(APIView):
         serializer = UserSerializer(request.user)
         return Response(serializer.data)
     
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(SparseFieldsetMixin, ProjectionMixin, PrefetchMixin, viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsOwnerOrReadOnly]
@@ -41,14 +45,12 @@ class UserViewSet(viewsets.ModelViewSet):
         """List all service requests made by this user."""
         from servicerequests.models import ServiceRequest
         from servicerequests.serializers import ServiceRequestDetailSerializer
+        from servicerequests.pagination import ServiceRequestPagination
         user = self.get_object()
-        requests = ServiceRequest.objects.filter(client=user)
-        page = self.paginate_queryset(requests)
-        if page is not None:
-            serializer = ServiceRequestDetailSerializer(page, many=True, context={'request': request})
-            return self.get_paginated_response(serializer.data)
-        serializer = ServiceRequestDetailSerializer(requests, many=True, context={'request': request})
-        return Response(serializer.data)
+        serializer_class = sparse_serializer_class(ServiceRequestDetailSerializer, request)
+        return paginated_response(
+            ServiceRequest.objects.filter(client=user), serializer_class, ServiceRequestPagination(), request, self,
+        )
     
         
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
@@ -73,4 +75,5 @@ class UserViewSet(viewsets.ModelViewSet):
 
         user.set_password(new_password)
         user.save()
+        invalidate_user(user.pk)
         return Response({'detail': 'Senha alterada com sucesso.'}, status=status.HTTP_200_OK)
\ No newline at end of file